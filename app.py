@@ -95,9 +95,11 @@ if filters.get('auto_refresh', False):
     if time_since_update > 1800:  # 30 минут
         if st.session_state.df is not None:
             with st.sidebar.spinner("🔄 Автообновление данных..."):
-                db_loader.load_data_from_db(
+                # Только новые показания с прошлой загрузки
+                db_loader.refresh_data_from_db(
                     days_back=filters['days_back'],
-                    limit_rows=filters['limit_rows']
+                    limit_rows=filters['limit_rows'],
+                    transport=filters['transport']
                 )
 
 # Основное содержимое
@@ -112,6 +114,7 @@ if st.session_state.df is not None:
         - Записей: {meta['total_records']:,}
         - Абонентов: {meta['unique_subscribers']:,}
         - Управлений: {meta['unique_managements']:,}
+        - Память: {meta.get('bytes_per_row', 0):.0f} байт/строку
         - Период: {meta['date_range']['min'].strftime('%d.%m.%Y')} - {meta['date_range']['max'].strftime('%d.%m.%Y')}
         - Обновлено: {meta['loaded_at'].strftime('%H:%M:%S')}
         """)
@@ -170,6 +173,7 @@ if st.session_state.df is not None:
         with st.spinner("Обновление данных..."):
             db_loader.load_data_from_db(
                 days_back=filters['days_back'],
-                limit_rows=filters['limit_rows']
+                limit_rows=filters['limit_rows'],
+                transport=filters['transport']
             )
             st.rerun()
\ No newline at end of file
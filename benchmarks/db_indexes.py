@@ -0,0 +1,161 @@
+# benchmarks/db_indexes.py
+"""
+Планы запросов дашборда (modules/db_loader) без индексов миграции и с ними
+(src/database/migrations.py, индексы gas_readings).
+
+Запуск из корня проекта (подключение - переменные окружения DB_*, как у дашборда):
+    python -m benchmarks.db_indexes --days-back 30 --repeat 3
+
+Оба состояния готовятся внутри транзакции, которая затем откатывается: для "без
+индексов" индексы удаляются (DROP INDEX), для "с индексами" недостающие создаются.
+DROP INDEX держит эксклюзивную блокировку gas_readings до отката, поэтому запускать
+лучше на копии базы или вне рабочего времени.
+"""
+import argparse
+import json
+from datetime import date, timedelta
+
+from psycopg2 import sql
+
+from modules.db_loader import (
+    AGGREGATE_QUERIES, DELTA_QUERY, FETCH_BATCH_SIZE, MANAGEMENTS_QUERY, READINGS_QUERY,
+    WATERMARK_QUERY, subscriber_history_query
+)
+from src.database.connection import connect_from_env
+from src.database.migrations import MIGRATIONS, MigrationRunner, find_index
+
+TABLE = "gas_readings"
+
+
+def dashboard_queries(cursor, days_back, limit_rows, subscribers):
+    """(название, запрос, параметры) по данным текущей базы"""
+    cursor.execute(f"SELECT MAX(reading_date), MAX(created_at) FROM {TABLE}")
+    last_date, last_created = cursor.fetchone()
+    cursor.execute(f"SELECT management FROM {TABLE} LIMIT 1")
+    management = cursor.fetchone()[0]
+    cursor.execute(f"SELECT DISTINCT subscriber_id FROM {TABLE} LIMIT %s", (subscribers,))
+    subscriber_ids = [row[0] for row in cursor.fetchall()]
+    start_date = last_date - timedelta(days=days_back)
+    period = {'date_from': start_date, 'date_to': date.max, 'management': None}
+
+    queries = [
+        ("окно показаний", READINGS_QUERY, (start_date, limit_rows)),
+        ("водяной знак", WATERMARK_QUERY, (start_date,)),
+        ("дозагрузка", DELTA_QUERY, (last_created, start_date)),
+    ]
+    queries += [(f"агрегат {name}", query, period) for name, query in AGGREGATE_QUERIES.items()]
+    queries += [
+        ("агрегат daily_management (управление)", AGGREGATE_QUERIES['daily_management'],
+         dict(period, management=management)),
+        ("список управлений", MANAGEMENTS_QUERY, None),
+        (f"история {len(subscriber_ids)} абонентов (1-я страница)",
+         subscriber_history_query(('md_id', 'gas_consumption')),
+         {'subscriber_ids': subscriber_ids, 'date_from': date.min, 'page_size': FETCH_BATCH_SIZE,
+          'after_subscriber': '', 'after_date': date.min, 'after_id': 0}),
+    ]
+    return queries
+
+
+def migration_indexes():
+    """Индексы gas_readings из MIGRATIONS"""
+    return [spec for migration in MIGRATIONS for spec in migration.get("indexes", [])
+            if spec[0] == TABLE]
+
+
+def drop_indexes(cursor):
+    """Удаление индексов миграции (кроме обеспечивающих ограничения)"""
+    for table, method, columns in migration_indexes():
+        name = find_index(cursor, table, method, columns)
+        if name is None:
+            continue
+        cursor.execute("SELECT 1 FROM pg_constraint WHERE conindid = to_regclass(%s)", (name,))
+        if cursor.fetchone() is None:
+            cursor.execute(sql.SQL("DROP INDEX {}").format(sql.Identifier(name)))
+    cursor.execute(f"ANALYZE {TABLE}")
+
+
+def create_indexes(cursor, conn):
+    MigrationRunner(conn).ensure_indexes(cursor, migration_indexes())
+
+
+def plan_outline(node, depth=0):
+    """Строки дерева плана: тип узла, индекс, таблица"""
+    line = "  " * depth + node["Node Type"]
+    if "Index Name" in node:
+        line += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        line += f" on {node['Relation Name']}"
+    lines = [line]
+    for child in node.get("Plans", []):
+        lines += plan_outline(child, depth + 1)
+    return lines
+
+
+def explain(cursor, query, params, repeat):
+    """Лучшее время выполнения (мс), прочитанные буферы и план"""
+    best = None
+    for _ in range(repeat):
+        cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, params)
+        result = cursor.fetchone()[0]
+        result = json.loads(result) if isinstance(result, str) else result
+        plan = result[0]
+        if best is None or plan["Execution Time"] < best["Execution Time"]:
+            best = plan
+    top = best["Plan"]
+    buffers = top.get("Shared Hit Blocks", 0) + top.get("Shared Read Blocks", 0)
+    return best["Execution Time"], buffers, plan_outline(top)
+
+
+def measure(conn, prepare, queries, repeat):
+    """Замеры всех запросов в транзакции, подготовленной prepare, с откатом"""
+    results = []
+    try:
+        with conn.cursor() as cursor:
+            prepare(cursor)
+            for _, query, params in queries:
+                results.append(explain(cursor, query, params, repeat))
+    finally:
+        conn.rollback()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Планы запросов дашборда до и после индексов")
+    parser.add_argument("--days-back", type=int, default=30, help="Глубина окна дашборда, дней")
+    parser.add_argument("--limit-rows", type=int, default=100_000, help="LIMIT окна показаний")
+    parser.add_argument("--subscribers", type=int, default=100,
+                        help="Абонентов в запросе истории")
+    parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого запроса (берется лучший)")
+    parser.add_argument("--quiet", action="store_true", help="Только сводная таблица без планов")
+    args = parser.parse_args()
+
+    conn = connect_from_env()
+    try:
+        with conn.cursor() as cursor:
+            queries = dashboard_queries(cursor, args.days_back, args.limit_rows, args.subscribers)
+        conn.rollback()
+
+        before = measure(conn, drop_indexes, queries, args.repeat)
+        after = measure(conn, lambda cursor: create_indexes(cursor, conn), queries, args.repeat)
+    finally:
+        conn.close()
+
+    if not args.quiet:
+        for (name, _, _), (_, _, plan_before), (_, _, plan_after) in zip(queries, before, after):
+            print(f"=== {name}")
+            print("  без индексов:")
+            print("\n".join("    " + line for line in plan_before))
+            print("  с индексами:")
+            print("\n".join("    " + line for line in plan_after))
+        print()
+
+    print(f"{'запрос':<40} {'до, мс':>10} {'после, мс':>10} {'ускорение':>10} "
+          f"{'буферов до':>11} {'после':>9}")
+    for (name, _, _), (time_before, buffers_before, _), (time_after, buffers_after, _) in zip(
+            queries, before, after):
+        print(f"{name:<40} {time_before:>10.1f} {time_after:>10.1f} "
+              f"{time_before / max(time_after, 0.001):>9.1f}x {buffers_before:>11,} {buffers_after:>9,}")
+
+
+if __name__ == "__main__":
+    main()
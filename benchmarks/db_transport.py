@@ -0,0 +1,65 @@
+# benchmarks/db_transport.py
+"""
+Сравнение способов загрузки показаний из gas_readings (modules/db_loader.fetch_readings):
+pandas.read_sql_query, серверный курсор пакетами и COPY TO STDOUT + polars.
+
+Запуск из корня проекта (подключение - переменные окружения DB_*, как у дашборда):
+    python -m benchmarks.db_transport --rows 100000 1000000 10000000
+
+Каждый замер выполняется в отдельном процессе, поэтому пиковая память (maxrss)
+относится только к нему. В gas_readings должно быть не меньше строк, чем запрошено,
+иначе в таблице результатов будет фактическое число.
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from src.database.connection import connect_from_env
+
+# Дата начала, заведомо раньше всех показаний: ограничение задает только LIMIT
+START_DATE = date(1900, 1, 1)
+
+
+def run_transport(transport, rows):
+    """Один замер в рабочем процессе: (секунд, строк, пиковая память МБ)"""
+    from modules.db_loader import fetch_readings
+
+    conn = connect_from_env()
+    try:
+        started = time.perf_counter()
+        df = fetch_readings(conn, START_DATE, rows, transport)
+        elapsed = time.perf_counter() - started
+    finally:
+        conn.close()
+    return elapsed, len(df), resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    from modules.db_loader import TRANSPORTS
+
+    parser = argparse.ArgumentParser(description="Сравнение способов загрузки gas_readings")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000],
+                        help="Размеры выборки (LIMIT)")
+    parser.add_argument("--transports", nargs="+", default=list(TRANSPORTS),
+                        choices=list(TRANSPORTS), help="Сравниваемые способы")
+    parser.add_argument("--repeat", type=int, default=1, help="Повторов каждого замера (берется лучший)")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'строк':>12} {'способ':>8} {'получено':>10} {'время, с':>9} {'строк/с':>11} {'память, МБ':>11}")
+    for rows in args.rows:
+        for transport in args.transports:
+            results = []
+            for _ in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    results.append(executor.submit(run_transport, transport, rows).result())
+            elapsed, loaded, maxrss = min(results)
+            print(f"{rows:>12,} {transport:>8} {loaded:>10,} {elapsed:>9.2f} "
+                  f"{loaded / elapsed:>11,.0f} {maxrss:>11,.0f}")
+
+
+if __name__ == "__main__":
+    main()
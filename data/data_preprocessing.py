@@ -1,191 +1,383 @@
+import argparse
+import codecs
+import contextlib
 import glob
+import io
+import mmap
+import multiprocessing
 import os
+import sys
+import time
+import unicodedata
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
+import polars as pl
+import pyarrow.dataset as ds
 import chardet
 
+from src.data_processing.loader import line_aligned_ranges
+from src.data_processing.manifest import FILE_UNCHANGED, ImportManifest
+
+# Размер пакета строк при потоковой обработке
+CHUNK_SIZE = 200_000
+
+# Размер диапазона байтов при параллельной обработке одного файла (--split)
+RANGE_SIZE = 64 * 1024 * 1024
+
+CLEANED_COLUMNS = ['city', 'account_number', 'meter_number', 'reading_date', 
+                   'consumption', 'reading_method']
+
+# Формат результата: секционированный Parquet (основной) или *_cleaned.csv
+OUTPUT_FORMATS = ['parquet', 'csv']
+PARQUET_PARTITIONS = ['city', 'year']
+# Суффикс файлов, которые еще пишутся (см. ParquetChunkWriter)
+PARQUET_TEMP_SUFFIX = '.tmp'
+
+# Журнал уже очищенных файлов (хранится в папке результата)
+MANIFEST_FILENAME = 'manifest.sqlite'
+
+# Подбор кодировки: объем выборки для chardet и размер блока при проверке декодированием
+ENCODING_SAMPLE_SIZE = 64 * 1024
+DECODE_BLOCK_SIZE = 1024 * 1024
+FALLBACK_ENCODINGS = ['windows-1251', 'utf-8-sig', 'utf-8', 'MacCyrillic']
+
+# Проверяется первой: однобайтовые кодировки (cp1251 и т.п.) декодируют почти любые
+# байты, а файл в другой кодировке строгую проверку UTF-8 почти никогда не проходит
+UTF8_ENCODING = 'utf-8-sig'
+
+# Множества символов, совпадающие со str.isdigit() / str.isspace() / int(),
+# чтобы векторная очистка давала тот же результат, что и посимвольная
+DIGIT_CHARS = ''.join(chr(c) for c in range(sys.maxunicode + 1) if chr(c).isdigit())
+WHITESPACE_CHARS = ''.join(chr(c) for c in range(sys.maxunicode + 1) if chr(c).isspace())
+NON_DIGIT_PATTERN = f'[^{DIGIT_CHARS}]'
+NON_NUMERIC_PATTERN = f'[^{DIGIT_CHARS}.\\-]'
+
+# Десятичные цифры любых алфавитов и их ASCII-эквиваленты (их принимают int() и float())
+DECIMAL_CHARS = [c for c in DIGIT_CHARS if unicodedata.decimal(c, None) is not None]
+ASCII_DECIMALS = [str(unicodedata.decimal(c)) for c in DECIMAL_CHARS]
+
 def detect_encoding(file_path):
     """Определяет кодировку файла."""
     with open(file_path, 'rb') as f:
-        raw_data = f.read(10000)
+        raw_data = f.read(ENCODING_SAMPLE_SIZE)
     result = chardet.detect(raw_data)
     return result['encoding']
 
-def clean_csv_data(file_path, output_folder):
-    """Очищает и обрабатывает CSV файл."""
+def decodes_cleanly(file_path, encoding):
+    """Проверяет, что файл целиком декодируется в encoding.
+    
+    Байты читаются потоком и проходят через инкрементальный декодер без разбора CSV,
+    поэтому проверка стоит одного последовательного чтения файла.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+    except (LookupError, TypeError):
+        return False
+    
+    try:
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(DECODE_BLOCK_SIZE), b''):
+                decoder.decode(block)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def resolve_encoding(file_path):
+    """Подбирает кодировку файла до его разбора.
+    
+    Сначала файл проверяется строгим декодированием UTF-8, затем - кодировкой,
+    предложенной chardet, затем запасными вариантами. Возвращает None, если файл
+    не декодируется ни одной.
+    """
+    detected = detect_encoding(file_path)
+    
+    checked = set()
+    for encoding in [UTF8_ENCODING, detected] + FALLBACK_ENCODINGS:
+        if not encoding:
+            continue
+        try:
+            codec_name = codecs.lookup(encoding).name
+        except LookupError:
+            continue
+        # windows-1251 и cp1251 - один и тот же кодек
+        if codec_name in checked:
+            continue
+        checked.add(codec_name)
+        
+        if decodes_cleanly(file_path, encoding):
+            return encoding
+    
+    return None
+
+def to_ascii_digits(expr):
+    """Заменяет десятичные цифры других алфавитов на ASCII, чтобы их понимал cast()."""
+    return expr.str.replace_many(DECIMAL_CHARS, ASCII_DECIMALS)
+
+def zfill2(expr):
+    """str.zfill(2) по символам (zfill в polars считает байты)."""
+    return pl.when(expr.str.len_chars() < 2).then(pl.lit('0') + expr).otherwise(expr)
+
+def convert_dates(frame, column):
+    """Приводит даты dd.mm.yy / dd.mm.yyyy к виду yyyy-mm-dd.
+    
+    Значения без трех частей через точку возвращаются как есть (без пробелов по краям),
+    некорректные даты и пустые значения - как null. Промежуточные столбцы считаются
+    по шагам, чтобы polars не вычислял одни и те же подвыражения повторно.
+    """
+    pattern = r'^([^.]*)\.([^.]*)\.([^.]*)$'
+    
+    frame = frame.with_columns(
+        pl.col(column).fill_null('').str.strip_chars(WHITESPACE_CHARS).alias('_text')
+    )
+    
+    # Ровно три части через точку; из каждой оставляем только цифры
+    frame = frame.with_columns(
+        pl.col('_text').str.to_lowercase().is_in(['nan', 'none', '']).alias('_empty'),
+        pl.col('_text').str.contains(pattern).alias('_has_parts'),
+        *[
+            pl.col('_text').str.extract(pattern, i).fill_null('')
+            .str.replace_all(NON_DIGIT_PATTERN, '').alias(name)
+            for i, name in ((1, '_day'), (2, '_month'), (3, '_year'))
+        ]
+    )
+    
+    # Двузначный год: < 50 - XXI век, иначе XX век; нечисловой двузначный год - ошибка
+    frame = frame.with_columns(
+        (pl.col('_year').str.len_chars() == 2).alias('_short_year'),
+        to_ascii_digits(pl.col('_year')).cast(pl.Int32, strict=False).alias('_year_number')
+    )
+    frame = frame.with_columns(
+        pl.when(pl.col('_short_year') & (pl.col('_year_number') < 50))
+        .then(pl.lit('20') + pl.col('_year'))
+        .when(pl.col('_short_year')).then(pl.lit('19') + pl.col('_year'))
+        .otherwise(pl.col('_year'))
+        .alias('_full_year')
+    )
+    
+    valid = (
+        (pl.col('_day') != '') & (pl.col('_month') != '')
+        & (pl.col('_full_year').str.len_chars() == 4)
+        & ~(pl.col('_short_year') & pl.col('_year_number').is_null())
+    )
+    formatted = pl.concat_str(
+        [pl.col('_full_year'), zfill2(pl.col('_month')), zfill2(pl.col('_day'))],
+        separator='-'
+    )
+    
+    return frame.with_columns(
+        pl.when(pl.col('_empty')).then(None)
+        .when(pl.col('_has_parts') & valid).then(formatted)
+        .when(pl.col('_has_parts')).then(None)
+        .otherwise(pl.col('_text'))
+        .alias(column)
+    ).drop('_text', '_empty', '_has_parts', '_day', '_month', '_year',
+           '_short_year', '_year_number', '_full_year')
+
+def clean_meter_numbers(column):
+    """Оставляет в номере счетчика только цифры."""
+    return pl.col(column).fill_null('').str.replace_all(NON_DIGIT_PATTERN, '').alias(column)
+
+def clean_consumption(column):
+    """Показание в float: без пробелов, запятая как десятичный разделитель."""
+    cleaned = (pl.col(column).fill_null('')
+               .str.replace_all(',', '.', literal=True)
+               .str.replace_all(NON_NUMERIC_PATTERN, ''))
+    
+    # Разбираем только строки, которые принимает float(); остальное - null
+    parsable = cleaned.str.contains(r'^-?(?:\d+\.?\d*|\.\d+)$')
+    return (
+        pl.when(parsable)
+        .then(to_ascii_digits(cleaned).cast(pl.Float64, strict=False))
+        .alias(column)
+    )
+
+def clean_text(column):
+    """Убирает пробелы по краям, кавычки и неразрывные пробелы."""
+    # Пропуски превращаются в 'nan', как и при str(x) в прежней построчной очистке
+    return (pl.col(column).fill_null('nan')
+            .str.strip_chars(WHITESPACE_CHARS)
+            .str.replace_all('"', '', literal=True)
+            .str.replace_all('\xa0', ' ', literal=True)
+            .alias(column))
+
+def clean_chunk(df):
+    """Очищает один пакет строк с уже назначенными именами столбцов."""
+    frame = pl.from_pandas(df[CLEANED_COLUMNS])
+    
+    # 1. Даты
+    frame = convert_dates(frame, 'reading_date')
+    
+    frame = frame.with_columns(
+        # 2. meter_number - только цифры
+        clean_meter_numbers('meter_number'),
+        # 3. consumption - убираем пробелы, заменяем запятую на точку
+        clean_consumption('consumption'),
+        # 4. Текстовые поля
+        *[clean_text(col) for col in ['city', 'account_number', 'reading_method']]
+    )
+    
+    # 5. Удаляем пустые строки
+    frame = frame.filter(
+        (pl.col('account_number').str.strip_chars(WHITESPACE_CHARS) != '')
+        & pl.col('reading_date').is_not_null()
+        & (pl.col('meter_number') != '')
+    )
+    
+    return frame
+
+def to_typed_frame(frame):
+    """Типизированное представление очищенного пакета для Parquet.
+    
+    Дата - Date (значения не в формате yyyy-mm-dd становятся null), потребление - Float32,
+    идентификаторы и способ снятия - словарные строки. Столбец year нужен для секционирования.
+    """
+    return frame.with_columns(
+        pl.col('reading_date').str.to_date('%Y-%m-%d', strict=False),
+        pl.col('consumption').cast(pl.Float32),
+        pl.col('account_number', 'meter_number', 'reading_method').cast(pl.Categorical)
+    ).with_columns(
+        pl.col('reading_date').dt.year().alias('year')
+    )
+
+class CsvChunkWriter:
+    """Дописывает очищенные пакеты в один файл *_cleaned.csv."""
+    
+    def __init__(self, output_folder, filename):
+        self.output_path = os.path.join(output_folder, filename.replace('.csv', '_cleaned.csv'))
+        self.output = open(self.output_path, 'w', encoding='utf-8-sig', newline='')
+        self.header = True
+    
+    def write(self, frame):
+        frame.to_pandas().to_csv(self.output, index=False, sep=';', header=self.header)
+        self.header = False
+    
+    def close(self):
+        self.output.close()
+    
+    def discard(self):
+        self.close()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+    
+    @property
+    def output_size(self):
+        return os.path.getsize(self.output_path)
+    
+    @property
+    def description(self):
+        return os.path.basename(self.output_path)
+
+class ParquetChunkWriter:
+    """Пишет очищенные пакеты в секционированный датасет output_folder/city=.../year=.../.
+    
+    Файлы источника называются <имя файла>-<номер пакета>-<i>.parquet, поэтому
+    повторная обработка заменяет только результат этого источника. Пакеты пишутся
+    во временные файлы (PARQUET_TEMP_SUFFIX, их не видят читатели *.parquet);
+    прежний результат источника заменяется только в close(), после успешной
+    обработки всего файла, а при ошибке остается нетронутым.
+    """
+    
+    def __init__(self, output_folder, filename):
+        self.dataset_dir = output_folder
+        self.source_name = os.path.splitext(filename)[0]
+        self.written_files = []
+        self.chunk_number = 0
+        
+        # Временные файлы прерванной прошлой обработки этого же файла
+        for stale_file in self.source_files(PARQUET_TEMP_SUFFIX):
+            os.remove(stale_file)
+    
+    def source_files(self, suffix=''):
+        """Файлы результата этого источника в датасете"""
+        pattern = f"{glob.escape(self.source_name)}-[0-9][0-9][0-9][0-9][0-9]-*.parquet{suffix}"
+        return glob.glob(os.path.join(self.dataset_dir, '**', pattern), recursive=True)
+    
+    def write(self, frame):
+        if frame.height > 0:
+            ds.write_dataset(
+                to_typed_frame(frame).to_arrow(),
+                self.dataset_dir,
+                format='parquet',
+                partitioning=PARQUET_PARTITIONS,
+                partitioning_flavor='hive',
+                basename_template=(f"{self.source_name}-{self.chunk_number:05d}-{{i}}.parquet"
+                                   f"{PARQUET_TEMP_SUFFIX}"),
+                existing_data_behavior='overwrite_or_ignore',
+                file_visitor=lambda written: self.written_files.append(written.path)
+            )
+        self.chunk_number += 1
+    
+    def close(self):
+        # Новые файлы занимают место прежних, оставшиеся прежние удаляются
+        old_files = {os.path.normpath(path) for path in self.source_files()}
+        final_files = []
+        for path in self.written_files:
+            final_path = os.path.normpath(path[:-len(PARQUET_TEMP_SUFFIX)])
+            os.replace(path, final_path)
+            final_files.append(final_path)
+        for old_file in old_files.difference(final_files):
+            os.remove(old_file)
+        self.written_files = final_files
+    
+    def discard(self):
+        for path in self.written_files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.written_files = []
+    
+    @property
+    def output_size(self):
+        return sum(os.path.getsize(path) for path in self.written_files)
+    
+    @property
+    def description(self):
+        return f"{self.dataset_dir} ({len(self.written_files)} Parquet-файлов)"
+
+def clean_csv_data(file_path, output_folder, chunk_size=CHUNK_SIZE, output_format='parquet',
+                   workers=1):
+    """Очищает и обрабатывает CSV файл потоково, пакетами по chunk_size строк.
+    
+    output_format='parquet' пишет секционированный датасет в output_folder,
+    'csv' - файл *_cleaned.csv. При workers > 1 файл делится на диапазоны байтов,
+    которые разбираются и очищаются в отдельных процессах (clean_csv_ranges).
+    Возвращает статистику обработки (rows_in, rows_out, output_size) или None при ошибке.
+    """
     filename = os.path.basename(file_path)
     print(f"\nОбработка файла: {filename}")
     
     try:
-        # Определяем кодировку файла
-        encoding = detect_encoding(file_path)
+        # Определяем кодировку файла до разбора - сам разбор выполняется один раз
+        encoding = resolve_encoding(file_path)
+        if encoding is None:
+            print(f"  ✗ Не удалось определить кодировку файла")
+            return None
         print(f"  Определенная кодировка: {encoding}")
         
-        # Пробуем разные кодировки
-        encodings_to_try = [encoding, 'windows-1251', 'cp1251', 'utf-8-sig', 'utf-8', 'MacCyrillic']
+        writer_class = ParquetChunkWriter if output_format == 'parquet' else CsvChunkWriter
+        writer = writer_class(output_folder, filename)
         
-        for enc in encodings_to_try:
-            try:
-                # Читаем CSV БЕЗ заголовков (header=None) с указанием типов для оптимизации
-                df = pd.read_csv(file_path, sep=';', encoding=enc, quotechar='"', 
-                                dtype=str, header=None, engine='python')
-                print(f"  Успешно прочитано с кодировкой: {enc}")
-                print(f"  Размер: {len(df):,} строк, {len(df.columns)} столбцов")
-                break
-            except UnicodeDecodeError:
-                continue
+        if workers > 1:
+            stats = clean_csv_ranges(file_path, writer, encoding, chunk_size, workers)
         else:
-            print(f"  ✗ Не удалось определить кодировку файла")
-            return False
-        
-        # Проверяем количество столбцов
-        if len(df.columns) < 6:
-            print(f"  ✗ Недостаточно столбцов: {len(df.columns)}")
-            return False
-        
-        # Назначаем имена столбцов
-        df.columns = ['city', 'account_number', 'meter_number', 'reading_date', 
-                     'consumption', 'reading_method']
-        
-        print(f"  Первые 3 строки для проверки:")
-        for i, row in df.head(3).iterrows():
-            print(f"    Строка {i}: {row['city']} | {row['account_number']} | {row['meter_number']} | "
-                  f"{row['reading_date']} | {row['consumption']} | {row['reading_method'][:30]}...")
+            stats = clean_csv_stream(file_path, writer, encoding, chunk_size)
+        if stats is None:
+            return None
         
-        # ОЧИСТКА ДАННЫХ - ОПТИМИЗИРОВАННАЯ ВЕРСИЯ
-        
-        # 1. Сначала обработаем даты - это важно для фильтрации
-        print("  Обработка дат...")
-        if 'reading_date' in df.columns:
-            # Векторизованная обработка дат
-            def convert_date_vectorized(series):
-                result = []
-                for date_str in series:
-                    try:
-                        date_str = str(date_str).strip()
-                        if pd.isna(date_str) or date_str.lower() in ['nan', 'none', '']:
-                            result.append(None)
-                            continue
-                        
-                        if '.' in date_str:
-                            parts = date_str.split('.')
-                            if len(parts) == 3:
-                                day, month, year = parts
-                                # Очищаем от нецифровых символов
-                                day = ''.join(c for c in day if c.isdigit())
-                                month = ''.join(c for c in month if c.isdigit())
-                                year = ''.join(c for c in year if c.isdigit())
-                                
-                                if not (day and month and year):
-                                    result.append(None)
-                                    continue
-                                
-                                # Форматируем год
-                                if len(year) == 2:
-                                    year = '20' + year if int(year) < 50 else '19' + year
-                                elif len(year) == 4:
-                                    pass
-                                else:
-                                    result.append(None)
-                                    continue
-                                
-                                result.append(f"{year.zfill(4)}-{month.zfill(2)}-{day.zfill(2)}")
-                                continue
-                        result.append(date_str)
-                    except:
-                        result.append(None)
-                return result
-            
-            df['reading_date'] = convert_date_vectorized(df['reading_date'])
-        
-        # 2. Обработка meter_number - убираем все пробелы
-        print("  Обработка номеров счетчиков...")
-        if 'meter_number' in df.columns:
-            df['meter_number'] = df['meter_number'].astype(str).apply(
-                lambda x: ''.join(c for c in str(x) if c.isdigit())
-            )
-        
-        # 3. Обработка consumption - убираем пробелы, заменяем запятую на точку
-        print("  Обработка показаний...")
-        if 'consumption' in df.columns:
-            def clean_consumption_simple(value):
-                try:
-                    value_str = str(value).strip()
-                    if not value_str or value_str.lower() in ['nan', 'none']:
-                        return None
-                    
-                    # Убираем все пробелы и неразрывные пробелы
-                    value_str = value_str.replace(' ', '').replace('\xa0', '')
-                    # Заменяем запятую на точку
-                    value_str = value_str.replace(',', '.')
-                    
-                    # Извлекаем только цифры, точку и минус
-                    cleaned = ''.join(c for c in value_str if c.isdigit() or c in '.-')
-                    
-                    if not cleaned or cleaned == '-':
-                        return None
-                    
-                    # Конвертируем в float
-                    return float(cleaned)
-                except:
-                    return None
-            
-            df['consumption'] = df['consumption'].apply(clean_consumption_simple)
+        output_size = writer.output_size
         
-        # 4. Обработка текстовых полей - делаем это в последнюю очередь
-        print("  Обработка текстовых полей...")
-        text_columns = ['city', 'account_number', 'reading_method']
-        for col in text_columns:
-            if col in df.columns:
-                # Быстрая очистка без сложных regex
-                df[col] = df[col].astype(str).apply(
-                    lambda x: str(x).strip().replace('"', '').replace('\xa0', ' ')
-                )
-        
-        # 5. Удаляем пустые строки
-        print("  Удаление пустых строк...")
-        initial_count = len(df)
-        
-        # Создаем маску для фильтрации
-        mask = df['account_number'].apply(lambda x: str(x).strip() != '') & \
-               df['reading_date'].notna() & \
-               df['meter_number'].apply(lambda x: str(x).strip() != '')
-        
-        df = df[mask].copy()
-        
-        print(f"  Удалено пустых строк: {initial_count - len(df):,}")
-        
-        # 6. Сохраняем очищенный файл частями если очень большой
-        output_filename = filename.replace('.csv', '_cleaned.csv')
-        output_path = os.path.join(output_folder, output_filename)
-        
-        # Если файл очень большой (>500к строк), сохраняем частями
-        if len(df) > 500000:
-            print(f"  Файл очень большой, сохраняем частями...")
-            # Разбиваем на части по 200к строк
-            chunks = [df[i:i + 200000] for i in range(0, len(df), 200000)]
-            
-            # Сохраняем первую часть с заголовком
-            chunks[0].to_csv(output_path, index=False, sep=';', encoding='utf-8-sig')
-            
-            # Добавляем остальные части без заголовка
-            for i, chunk in enumerate(chunks[1:], 1):
-                chunk.to_csv(output_path, mode='a', index=False, sep=';', 
-                           encoding='utf-8-sig', header=False)
-                print(f"    Часть {i+1} добавлена")
-        else:
-            # Сохраняем целиком
-            df.to_csv(output_path, index=False, sep=';', encoding='utf-8-sig')
-        
-        print(f"  ✓ Файл сохранен: {output_filename}")
+        print(f"  Удалено пустых строк: {stats['rows_in'] - stats['rows_out']:,}")
+        print(f"  ✓ Данные сохранены: {writer.description}")
         print(f"  Структура данных:")
-        print(f"    - Всего строк: {len(df):,}")
-        print(f"    - Всего столбцов: {len(df.columns)}")
-        print(f"    - Размер файла: {os.path.getsize(output_path) / (1024*1024):.2f} MB")
+        print(f"    - Всего строк: {stats['rows_out']:,}")
+        print(f"    - Всего столбцов: {len(CLEANED_COLUMNS)}")
+        print(f"    - Размер результата: {output_size / (1024*1024):.2f} MB")
         
         # Пример данных после очистки
-        if len(df) > 0:
+        row = stats['first_row']
+        if row is not None:
             print(f"  Пример после очистки:")
-            row = df.iloc[0]
             print(f"    Город: '{row['city'][:20]}...'")
             print(f"    Счет: {row['account_number']}")
             print(f"    Счетчик: {row['meter_number']}")
@@ -193,18 +385,261 @@ def clean_csv_data(file_path, output_folder):
             print(f"    Потребление: {row['consumption']}")
             print(f"    Метод: '{row['reading_method'][:30]}...'")
         
-        return True
+        return {
+            'rows_in': stats['rows_in'],
+            'rows_out': stats['rows_out'],
+            'output_size': output_size
+        }
         
     except Exception as e:
         import traceback
         print(f"  ✗ Ошибка при обработке файла {filename}: {str(e)}")
-        traceback.print_exc()
-        return False
+        traceback.print_exc(file=sys.stdout)
+        return None
+
+def clean_csv_stream(file_path, writer, encoding, chunk_size):
+    """Читает, очищает и передает writer пакеты фиксированного размера.
+    
+    В памяти одновременно находится не больше одного пакета.
+    """
+    stats = {'rows_in': 0, 'rows_out': 0, 'first_row': None}
+    
+    # Читаем CSV БЕЗ заголовков (header=None) пакетами по chunk_size строк
+    reader = pd.read_csv(file_path, sep=';', encoding=encoding, quotechar='"', 
+                         dtype=str, header=None, engine='c', chunksize=chunk_size)
+    
+    try:
+        with reader:
+            for chunk_number, df in enumerate(reader):
+                # Проверяем количество столбцов
+                if len(df.columns) < 6:
+                    print(f"  ✗ Недостаточно столбцов: {len(df.columns)}")
+                    break
+                
+                # Назначаем имена столбцов
+                df.columns = CLEANED_COLUMNS
+                
+                if chunk_number == 0:
+                    print_preview(df)
+                
+                cleaned = clean_chunk(df)
+                writer.write(cleaned)
+                
+                stats['rows_in'] += len(df)
+                stats['rows_out'] += cleaned.height
+                if stats['first_row'] is None and cleaned.height > 0:
+                    stats['first_row'] = cleaned.row(0, named=True)
+                
+                print(f"    Пакет {chunk_number + 1}: {stats['rows_in']:,} строк прочитано")
+            else:
+                writer.close()
+                return stats
+    except Exception:
+        # Ошибка разбора - частичный результат не нужен
+        writer.discard()
+        raise
+    
+    # Файл с неверной структурой - частичный результат не нужен
+    writer.discard()
+    return None
+
+def print_preview(df):
+    """Первые строки исходного файла для проверки структуры."""
+    print(f"  Первые 3 строки для проверки:")
+    for i, row in df.head(3).iterrows():
+        print(f"    Строка {i}: {row['city']} | {row['account_number']} | {row['meter_number']} | "
+              f"{row['reading_date']} | {row['consumption']} | {row['reading_method'][:30]}...")
+
+def clean_range_task(file_path, start, end, encoding, chunk_size=CHUNK_SIZE):
+    """Разбор и очистка диапазона байтов [start, end) файла в рабочем процессе.
+    
+    Диапазон начинается с начала строки и заканчивается переводом строки
+    (см. line_aligned_ranges). Возвращает число прочитанных строк, очищенный
+    кадр и исходные первые строки (только для диапазона с начала файла).
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    
+    reader = pd.read_csv(io.BytesIO(data), sep=';', encoding=encoding, quotechar='"',
+                         dtype=str, header=None, engine='c', chunksize=chunk_size)
+    rows_in = 0
+    frames = []
+    preview = None
+    with reader:
+        for df in reader:
+            if len(df.columns) < 6:
+                raise ValueError(f"Недостаточно столбцов: {len(df.columns)}")
+            df.columns = CLEANED_COLUMNS
+            if start == 0 and preview is None:
+                preview = df.head(3)
+            frames.append(clean_chunk(df))
+            rows_in += len(df)
+    
+    return {'rows_in': rows_in, 'frame': pl.concat(frames) if frames else None,
+            'preview': preview}
+
+def clean_csv_ranges(file_path, writer, encoding, chunk_size, workers):
+    """Параллельная очистка одного файла по диапазонам байтов.
+    
+    Файл делится на диапазоны около RANGE_SIZE байт по переводам строк вне кавычек,
+    диапазоны разбираются и очищаются в пуле процессов, а результаты передаются
+    writer строго по порядку. В работе одновременно не больше 2 * workers диапазонов.
+    Рабочие процессы запускаются через spawn: основной процесс к этому моменту уже
+    использует потоки polars, и fork мог бы унаследовать их блокировки.
+    """
+    stats = {'rows_in': 0, 'rows_out': 0, 'first_row': None}
+    
+    with open(file_path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            ranges = list(line_aligned_ranges(mapped, RANGE_SIZE))
+    print(f"  Диапазонов для параллельной обработки: {len(ranges)}")
+    
+    try:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            pending = deque()
+            remaining = iter(ranges)
+            for start, end in remaining:
+                pending.append(executor.submit(clean_range_task, file_path, start, end,
+                                               encoding, chunk_size))
+                if len(pending) >= 2 * workers:
+                    break
+            
+            range_number = 0
+            while pending:
+                result = pending.popleft().result()
+                next_range = next(remaining, None)
+                if next_range is not None:
+                    pending.append(executor.submit(clean_range_task, file_path, *next_range,
+                                                   encoding, chunk_size))
+                
+                if result['preview'] is not None:
+                    print_preview(result['preview'])
+                cleaned = result['frame']
+                if cleaned is not None:
+                    writer.write(cleaned)
+                    stats['rows_out'] += cleaned.height
+                    if stats['first_row'] is None and cleaned.height > 0:
+                        stats['first_row'] = cleaned.row(0, named=True)
+                stats['rows_in'] += result['rows_in']
+                
+                range_number += 1
+                print(f"    Диапазон {range_number}/{len(ranges)}: "
+                      f"{stats['rows_in']:,} строк прочитано")
+    except Exception:
+        writer.discard()
+        raise
+    
+    writer.close()
+    return stats
+
+def clean_file_task(file_path, output_folder, chunk_size=CHUNK_SIZE, output_format='parquet',
+                    workers=1):
+    """Обработка одного файла в рабочем процессе.
+    
+    Вывод clean_csv_data перехватывается и возвращается вместе с результатом,
+    чтобы сообщения разных процессов не перемешивались в консоли.
+    """
+    log = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        stats = clean_csv_data(file_path, output_folder, chunk_size, output_format, workers)
+    
+    result = {
+        'file': os.path.basename(file_path),
+        'success': stats is not None,
+        'rows_in': 0,
+        'rows_dropped': 0,
+        'output_size': 0,
+        'elapsed': time.perf_counter() - started,
+        'log': log.getvalue()
+    }
+    if stats is not None:
+        result['rows_in'] = stats['rows_in']
+        result['rows_dropped'] = stats['rows_in'] - stats['rows_out']
+        result['output_size'] = stats['output_size']
+    return result
+
+def clean_csv_files(csv_files, output_folder, workers=None, chunk_size=CHUNK_SIZE,
+                    output_format='parquet', split=False):
+    """Параллельная очистка набора файлов в пуле процессов.
+    
+    split=True - файлы обрабатываются по очереди, а каждый файл делится на диапазоны
+    байтов для workers процессов (для одного большого файла).
+    Возвращает список результатов по файлам в порядке csv_files.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Крупные файлы запускаем первыми, чтобы они не оказались в хвосте очереди
+    ordered = sorted(csv_files, key=os.path.getsize, reverse=True)
+    
+    results = {}
+    if split and workers > 1:
+        for csv_file in ordered:
+            results[csv_file] = clean_file_task(csv_file, output_folder, chunk_size, output_format,
+                                                workers)
+            print(results[csv_file]['log'], end='')
+    elif workers == 1:
+        for csv_file in ordered:
+            results[csv_file] = clean_file_task(csv_file, output_folder, chunk_size, output_format)
+            print(results[csv_file]['log'], end='')
+    else:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {
+                executor.submit(clean_file_task, csv_file, output_folder, chunk_size,
+                                output_format): csv_file
+                for csv_file in ordered
+            }
+            for future in as_completed(futures):
+                csv_file = futures[future]
+                try:
+                    results[csv_file] = future.result()
+                except Exception as e:
+                    # Падение рабочего процесса не должно останавливать остальные файлы
+                    results[csv_file] = {
+                        'file': os.path.basename(csv_file), 'success': False,
+                        'rows_in': 0, 'rows_dropped': 0, 'output_size': 0,
+                        'elapsed': 0.0, 'log': f"  ✗ Ошибка рабочего процесса: {e}\n"
+                    }
+                print(results[csv_file]['log'], end='')
+    
+    return [results[csv_file] for csv_file in csv_files]
+
+def print_summary(results, elapsed):
+    """Сводная таблица по всем обработанным файлам."""
+    print(f"\n{'Файл':<40} {'Строк':>12} {'Удалено':>10} {'Размер, MB':>11} {'Время, с':>9}")
+    for r in results:
+        status = '' if r['success'] else '  ✗'
+        print(f"{r['file'][:40]:<40} {r['rows_in']:>12,} {r['rows_dropped']:>10,} "
+              f"{r['output_size'] / (1024*1024):>11.2f} {r['elapsed']:>9.1f}{status}")
+    
+    rows_in = sum(r['rows_in'] for r in results)
+    rows_dropped = sum(r['rows_dropped'] for r in results)
+    output_size = sum(r['output_size'] for r in results)
+    print(f"{'ИТОГО':<40} {rows_in:>12,} {rows_dropped:>10,} "
+          f"{output_size / (1024*1024):>11.2f} {elapsed:>9.1f}")
 
 # Основной код
 if __name__ == "__main__":
+    # Запуск из корня проекта: python -m data.data_preprocessing [папка]
+    parser = argparse.ArgumentParser(description="Очистка CSV файлов с показаниями")
     # Укажите путь к папке с CSV файлами
-    input_folder = r"E:\magistr\KursProj\gas_consumption\data\raw"
+    parser.add_argument("input_folder", nargs="?",
+                        default=r"E:\magistr\KursProj\gas_consumption\data\raw")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Количество процессов (по умолчанию - число ядер)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="Размер пакета строк при чтении файла")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default='parquet',
+                        help="Формат результата: секционированный Parquet или *_cleaned.csv")
+    parser.add_argument("--split", action="store_true",
+                        help="Делить каждый файл на диапазоны байтов и очищать их параллельно "
+                             "(для одного большого файла)")
+    parser.add_argument("--force", action="store_true",
+                        help="Обработать все файлы, включая не изменившиеся с прошлого запуска")
+    args = parser.parse_args()
+    input_folder = args.input_folder
     
     # Проверяем существование папки
     if not os.path.exists(input_folder):
@@ -224,13 +659,25 @@ if __name__ == "__main__":
     cleaned_folder = os.path.join(input_folder, "cleaned")
     os.makedirs(cleaned_folder, exist_ok=True)
     
-    # Обрабатываем все файлы
-    successful = 0
-    for csv_file in csv_files:
-        if clean_csv_data(csv_file, cleaned_folder):
-            successful += 1
+    # Пропускаем файлы, не изменившиеся с прошлой обработки в том же формате
+    manifest = ImportManifest(os.path.join(cleaned_folder, MANIFEST_FILENAME),
+                              consumer=f"preprocessing-{args.format}")
+    pending = [f for f in csv_files if args.force or manifest.check(f) != FILE_UNCHANGED]
+    if len(pending) < len(csv_files):
+        print(f"Пропущено без изменений: {len(csv_files) - len(pending)} файлов")
+    
+    # Обрабатываем новые и измененные файлы
+    started = time.perf_counter()
+    results = clean_csv_files(pending, cleaned_folder, args.workers, args.chunk_size,
+                              args.format, args.split)
+    for csv_file, result in zip(pending, results):
+        if result['success']:
+            manifest.record(csv_file)
+    manifest.close()
+    successful = sum(r['success'] for r in results)
     
     print(f"\n{'='*50}")
     print("ОБРАБОТКА ЗАВЕРШЕНА!")
-    print(f"Успешно обработано: {successful} из {len(csv_files)} файлов")
-    print(f"Очищенные файлы сохранены в: {cleaned_folder}")
\ No newline at end of file
+    print_summary(results, time.perf_counter() - started)
+    print(f"Успешно обработано: {successful} из {len(pending)} файлов")
+    print(f"Очищенные файлы сохранены в: {cleaned_folder}")
@@ -5,6 +5,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from sklearn.ensemble import IsolationForest
 from datetime import datetime
+from modules.db_loader import subscriber_baseline_stats, subscriber_stats
 
 def render(df):
     """Рендеринг вкладки обнаружения аномалий"""
@@ -68,21 +69,17 @@ def detect_anomalies(df, method, threshold):
     recent_date = df['date_parsed'].max()
     last_month = recent_date - pd.DateOffset(months=1)
     
-    # Данные за последний месяц
-    recent_data = df[df['date_parsed'] >= last_month]
-    customer_recent = recent_data.groupby('subscriber_id').agg({
-        'gas_consumption': ['mean', 'std', 'count']
-    }).round(2)
-    customer_recent.columns = ['recent_mean', 'recent_std', 'recent_count']
-    customer_recent = customer_recent.reset_index()
-    
-    # Исторические данные
-    historical_data = df[df['date_parsed'] < last_month]
-    customer_historical = historical_data.groupby('subscriber_id').agg({
-        'gas_consumption': ['mean', 'std']
-    }).round(2)
-    customer_historical.columns = ['historical_mean', 'historical_std']
-    customer_historical = customer_historical.reset_index()
+    # Данные за последний месяц (агрегаты считает БД, см. db_loader.run_aggregate)
+    customer_recent = subscriber_stats(df, date_from=last_month.date()).round(2)
+    customer_recent = customer_recent.rename(columns={
+        'mean': 'recent_mean', 'std': 'recent_std', 'count': 'recent_count'
+    })[['subscriber_id', 'recent_mean', 'recent_std', 'recent_count']]
+    
+    # Исторические данные: вся история до начала месяца сравнения
+    customer_historical = subscriber_baseline_stats(df, last_month.date()).round(2)
+    customer_historical = customer_historical.rename(columns={
+        'mean': 'historical_mean', 'std': 'historical_std'
+    })[['subscriber_id', 'historical_mean', 'historical_std']]
     
     # Объединение данных
     anomaly_data = pd.merge(customer_recent, customer_historical, 
@@ -6,6 +6,7 @@ import plotly.graph_objects as go
 from sklearn.cluster import KMeans, AgglomerativeClustering
 from sklearn.preprocessing import StandardScaler
 import base64
+from modules.db_loader import subscriber_stats, subscriber_monthly_means
 from utils.visualization import create_cluster_scatter, create_cluster_profiles
 
 def render(df):
@@ -63,20 +64,18 @@ def render(df):
                 st.error(f"Ошибка кластеризации: {str(e)}")
 
 def prepare_customer_stats(df):
-    """Подготовка статистики по клиентам"""
-    customer_stats = df.groupby('subscriber_id').agg({
-        'gas_consumption': ['mean', 'sum', 'std', 'count']
+    """Подготовка статистики по клиентам за всю историю в БД (см. db_loader.run_aggregate)"""
+    customer_stats = subscriber_stats(df, full_history=True).rename(columns={
+        'mean': 'mean_consumption',
+        'sum': 'total_consumption',
+        'std': 'consumption_std',
+        'count': 'n_records'
     }).round(2)
     
-    customer_stats.columns = ['mean_consumption', 'total_consumption', 
-                            'consumption_std', 'n_records']
-    customer_stats = customer_stats.reset_index()
-    
     # Добавляем сезонность
-    df['month'] = df['date_parsed'].dt.month
-    monthly_avg = df.groupby(['subscriber_id', 'month'])['gas_consumption'].mean().unstack()
+    monthly_avg = subscriber_monthly_means(df, full_history=True).pivot(index='subscriber_id', columns='month', values='mean')
     seasonality = (monthly_avg.max(axis=1) - monthly_avg.min(axis=1)) / monthly_avg.mean(axis=1)
-    customer_stats['seasonality'] = seasonality.fillna(0).values
+    customer_stats['seasonality'] = seasonality.reindex(customer_stats['subscriber_id']).fillna(0).values
     
     return customer_stats
 
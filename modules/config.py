@@ -1,5 +1,7 @@
 # modules/config.py
 import streamlit as st
+from modules.db_pool import get_pool
+from modules.db_loader import get_result_cache
 
 def init_session_state():
     """Инициализация состояния сессии"""
@@ -30,6 +32,14 @@ def render_settings(df):
     st.subheader("📊 Внешние данные (UC-DAT-02)")
     render_external_data_settings()
     
+    # Соединения с БД
+    st.subheader("🔌 Пул соединений БД")
+    render_pool_stats()
+    
+    # Кэш результатов запросов
+    st.subheader("🗄️ Кэш запросов к БД")
+    render_cache_stats()
+    
     # Очистка данных
     st.subheader("🧹 Очистка данных")
     render_data_cleanup()
@@ -66,6 +76,54 @@ def render_external_data_settings():
             st.info("🔗 Загрузка данных о погоде и праздниках...")
             st.success("✅ Внешние данные успешно загружены")
 
+def render_pool_stats():
+    """Статистика общего пула соединений"""
+    try:
+        stats = get_pool().stats()
+    except Exception as e:
+        st.warning(f"Пул соединений недоступен: {str(e)}")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Занято / свободно", f"{stats['in_use']} / {stats['idle']}")
+    with col2:
+        st.metric("Выдач соединений", f"{stats['checkouts']:,}")
+    with col3:
+        st.metric("Ожидание (сред.)", f"{stats['wait_avg'] * 1000:.1f} мс")
+    with col4:
+        st.metric("Ожидание (макс.)", f"{stats['wait_max'] * 1000:.1f} мс")
+    
+    st.caption(
+        f"Ожидали свободного соединения: {stats['waits']}, таймаутов: {stats['timeouts']}, "
+        f"создано соединений: {stats['created']}, закрыто по простою: {stats['recycled']}, "
+        f"не прошли проверку: {stats['health_check_failures']}"
+    )
+
+def render_cache_stats():
+    """Статистика общего кэша результатов запросов"""
+    cache = get_result_cache()
+    stats = cache.stats()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Попаданий / промахов", f"{stats['hits']} / {stats['misses']}")
+    with col2:
+        st.metric("Доля попаданий", f"{stats['hit_rate']:.0%}")
+    with col3:
+        st.metric("Записей", stats['entries'])
+    with col4:
+        st.metric("Занято памяти", f"{stats['bytes'] / 1024 ** 2:.0f} из {stats['max_bytes'] / 1024 ** 2:.0f} МБ")
+    
+    st.caption(
+        f"Сброшено из-за новых данных: {stats['invalidations']}, по времени жизни: {stats['expirations']}, "
+        f"вытеснено по памяти: {stats['evictions']}"
+    )
+    
+    if st.button("🗑️ Очистить кэш запросов", key="clear_query_cache"):
+        cache.clear()
+        st.success("✅ Кэш запросов очищен")
+
 def render_data_cleanup():
     """Очистка данных"""
     if st.button("🗑️ Очистить все данные из памяти", key="clear_data"):
@@ -70,29 +70,402 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
+import polars as pl
+import pyarrow as pa
 import psycopg2
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import io
 import os
+import threading
+import time
+from collections import OrderedDict
 from dotenv import load_dotenv
 
+from modules.db_pool import get_pool
+from src.data_processing.compact import (
+    CATEGORY_COLUMNS, CONSUMPTION_COLUMN, compact_pandas, compact_polars, memory_per_row
+)
+from src.database.migrations import ANALYSIS_RESULTS_DDL
+from src.database.rollups import RollupManager, rollup_table_names
+
 # Загрузка переменных окружения
 load_dotenv()
 
+# Строк в одном пакете серверного курсора
+FETCH_BATCH_SIZE = 50_000
+
+# Показания за период: параметры - дата начала и лимит строк
+READINGS_QUERY = """
+SELECT 
+    management,
+    subscriber_id,
+    meter_id as md_id,
+    reading_date as date,
+    consumption as gas_consumption,
+    data_source as source,
+    created_at
+FROM gas_readings
+WHERE reading_date >= %s
+ORDER BY reading_date DESC
+LIMIT %s
+"""
+
+# Строки, добавленные или перезагруженные после водяного знака (для refresh_data_from_db):
+# параметры - водяной знак created_at (минус DELTA_OVERLAP) и дата начала окна
+DELTA_QUERY = """
+SELECT 
+    management,
+    subscriber_id,
+    meter_id as md_id,
+    reading_date as date,
+    consumption as gas_consumption,
+    data_source as source,
+    created_at
+FROM gas_readings
+WHERE created_at >= %s AND reading_date >= %s
+ORDER BY created_at
+"""
+
+# Перекрытие дозагрузки: created_at DEFAULT CURRENT_TIMESTAMP - время начала транзакции
+# загрузки, поэтому строки транзакции, зафиксированной после прошлого обновления,
+# могут оказаться ниже водяного знака. Повторно прочитанные строки заменяются по READING_KEY
+DELTA_OVERLAP = timedelta(seconds=float(os.getenv("DB_DELTA_OVERLAP", "900")))
+
+# Показание в кадре однозначно определяется абонентом, прибором и датой
+READING_KEY = ['subscriber_id', 'md_id', 'date']
+
+# Агрегаты для вкладок (см. run_aggregate): период [date_from, date_to)
+AGGREGATE_QUERIES = {
+    # Суммарное потребление по дням и управлениям
+    'daily_management': """
+        SELECT reading_date AS date_parsed, management,
+               SUM(consumption)::float8 AS gas_consumption
+        FROM gas_readings
+        WHERE reading_date >= %(date_from)s AND reading_date < %(date_to)s
+          AND (%(management)s::text IS NULL OR management = %(management)s)
+        GROUP BY reading_date, management
+        ORDER BY reading_date, management
+    """,
+    # Статистика потребления по абонентам
+    'subscriber_stats': """
+        SELECT subscriber_id,
+               AVG(consumption)::float8 AS mean,
+               SUM(consumption)::float8 AS sum,
+               STDDEV_SAMP(consumption)::float8 AS std,
+               COUNT(*) AS count
+        FROM gas_readings
+        WHERE reading_date >= %(date_from)s AND reading_date < %(date_to)s
+        GROUP BY subscriber_id
+        ORDER BY subscriber_id
+    """,
+    # Среднее потребление абонента по месяцам года
+    'subscriber_monthly': """
+        SELECT subscriber_id,
+               EXTRACT(MONTH FROM reading_date)::int AS month,
+               AVG(consumption)::float8 AS mean
+        FROM gas_readings
+        WHERE reading_date >= %(date_from)s AND reading_date < %(date_to)s
+        GROUP BY subscriber_id, month
+        ORDER BY subscriber_id, month
+    """,
+}
+
+# Сводные таблицы gas_readings (src/database/rollups.py)
+ROLLUP_TABLES = rollup_table_names('gas_readings')
+
+# Те же агрегаты по сводным таблицам: сводки по абонентам помесячные,
+# поэтому годятся для периодов, границы которых - начала месяцев
+ROLLUP_QUERIES = {
+    'daily_management': f"""
+        SELECT reading_date AS date_parsed, management,
+               SUM(consumption_sum) AS gas_consumption
+        FROM {ROLLUP_TABLES['daily']}
+        WHERE reading_date >= %(date_from)s AND reading_date < %(date_to)s
+          AND (%(management)s::text IS NULL OR management = %(management)s)
+        GROUP BY reading_date, management
+        ORDER BY reading_date, management
+    """,
+    'subscriber_stats': f"""
+        SELECT subscriber_id,
+               (SUM(consumption_sum) / SUM(readings_count))::float8 AS mean,
+               SUM(consumption_sum) AS sum,
+               CASE WHEN SUM(readings_count) > 1 THEN
+                   SQRT(GREATEST(
+                       (SUM(consumption_sq_sum) - SUM(consumption_sum) ^ 2 / SUM(readings_count))
+                       / (SUM(readings_count) - 1), 0))
+               END::float8 AS std,
+               SUM(readings_count)::bigint AS count
+        FROM {ROLLUP_TABLES['monthly']}
+        WHERE month_start >= %(date_from)s AND month_start < %(date_to)s
+        GROUP BY subscriber_id
+        ORDER BY subscriber_id
+    """,
+    # subscriber_stats за всю историю - готовые итоги по абонентам
+    'subscriber_lifetime': f"""
+        SELECT subscriber_id, mean_consumption AS mean, consumption_sum AS sum,
+               std_consumption AS std, readings_count AS count
+        FROM {ROLLUP_TABLES['lifetime']}
+        ORDER BY subscriber_id
+    """,
+    'subscriber_monthly': f"""
+        SELECT subscriber_id,
+               EXTRACT(MONTH FROM month_start)::int AS month,
+               (SUM(consumption_sum) / SUM(readings_count))::float8 AS mean
+        FROM {ROLLUP_TABLES['monthly']}
+        WHERE month_start >= %(date_from)s AND month_start < %(date_to)s
+        GROUP BY subscriber_id, month
+        ORDER BY subscriber_id, month
+    """,
+}
+
+# Список управлений для фильтра
+MANAGEMENTS_QUERY = "SELECT DISTINCT management FROM gas_readings ORDER BY management"
+
+# История абонентов (fetch_subscribers_history): столбец кадра -> столбец gas_readings
+SUBSCRIBER_HISTORY_COLUMNS = {
+    'md_id': 'meter_id',
+    'gas_consumption': 'consumption',
+    'source': 'data_source',
+    'management': 'management',
+    'created_at': 'created_at',
+}
+
+# Страница истории абонентов: ключ (subscriber_id, reading_date, id) - продолжение
+# после последней строки предыдущей страницы по индексу (subscriber_id, reading_date)
+SUBSCRIBER_HISTORY_QUERY = """
+SELECT
+    subscriber_id,
+    reading_date as date,
+    {columns},
+    id as reading_id
+FROM gas_readings
+WHERE subscriber_id = ANY(%(subscriber_ids)s)
+  AND reading_date >= %(date_from)s
+  AND (subscriber_id, reading_date, id) > (%(after_subscriber)s, %(after_date)s, %(after_id)s)
+ORDER BY subscriber_id, reading_date, id
+LIMIT %(page_size)s
+"""
+
+# Сводные таблицы созданы (python -m src.database.rollups)
+ROLLUPS_AVAILABLE_QUERY = f"SELECT to_regclass('{ROLLUP_TABLES['lifetime']}') IS NOT NULL"
+
+# Способы получения строк (см. fetch_readings)
+TRANSPORTS = {
+    'cursor': "Серверный курсор",
+    'copy': "COPY (CSV)",
+    'pandas': "pandas.read_sql_query",
+}
+DEFAULT_TRANSPORT = 'cursor'
+
+# Общий кэш результатов (ResultCache): время жизни записи и бюджет памяти
+RESULT_CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "3600"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("DB_CACHE_MAX_MB", "512")) * 1024 ** 2
+
+# Водяной знак окна: новые, удаленные или перезагруженные строки меняют его
+WATERMARK_QUERY = """
+SELECT MAX(created_at), COUNT(*)
+FROM gas_readings
+WHERE reading_date >= %s
+"""
+
+# Типы столбцов CSV из COPY для разбора polars
+COPY_SCHEMA_OVERRIDES = {
+    'management': pl.Utf8,
+    'subscriber_id': pl.Utf8,
+    'date': pl.Date,
+    'gas_consumption': pl.Float32,
+    'source': pl.Utf8,
+}
+
 def get_db_connection():
-    """Создание подключения к PostgreSQL"""
+    """Соединение с PostgreSQL из общего пула (вернуть через release_db_connection)"""
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            database=os.getenv("DB_NAME", "gas_consumption"),
-            user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", ""),
-            port=os.getenv("DB_PORT", "5432")
-        )
-        return conn
+        return get_pool().getconn()
     except Exception as e:
         st.sidebar.error(f"❌ Ошибка подключения к БД: {str(e)}")
         return None
 
+def release_db_connection(conn):
+    """Возврат соединения в пул"""
+    if conn is not None:
+        get_pool().putconn(conn)
+
+def rows_to_record_batch(columns, rows):
+    """Пакет строк курсора -> столбцы Arrow в компактных типах
+    
+    Строковые столбцы справочников кодируются словарем сразу, потребление - Float32,
+    остальные типы (дата, время, ID) выводятся Arrow из значений psycopg2.
+    """
+    arrays = []
+    for name, values in zip(columns, zip(*rows)):
+        if name == CONSUMPTION_COLUMN:
+            array = pa.array(np.array(values, dtype=np.float32))
+        else:
+            array = pa.array(values)
+            if name in CATEGORY_COLUMNS and pa.types.is_string(array.type):
+                array = array.dictionary_encode()
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+def stream_query(conn, query, params=None, batch_size=FETCH_BATCH_SIZE, on_progress=None):
+    """Потоковое чтение результата запроса через серверный (именованный) курсор
+    
+    Строки забираются по batch_size и сразу переводятся в столбцы Arrow, поэтому
+    в памяти нет полного списка кортежей Python. on_progress(строк_загружено)
+    вызывается после каждого пакета. Возвращает pandas DataFrame
+    (справочники - category, дата - date32).
+    """
+    batches = []
+    loaded = 0
+    with conn.cursor(name="stream_query") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            columns = [column[0] for column in cursor.description]
+            batches.append(rows_to_record_batch(columns, rows))
+            loaded += len(rows)
+            if on_progress is not None:
+                on_progress(loaded)
+    
+    return batches_to_frame(batches)
+
+def batches_to_frame(batches):
+    """Пакеты Arrow -> pandas DataFrame (справочники - category, дата - date32)"""
+    if not batches:
+        return pd.DataFrame()
+    
+    table = pa.concat_tables(
+        [pa.Table.from_batches([batch]) for batch in batches], promote_options="default"
+    ).unify_dictionaries()
+    return table.to_pandas(
+        types_mapper=lambda arrow_type: pd.ArrowDtype(arrow_type) if arrow_type == pa.date32() else None
+    )
+
+def copy_query(conn, query, params=None):
+    """Чтение результата запроса через COPY (...) TO STDOUT в CSV и разбор polars
+    
+    Сервер отдает готовый CSV одним потоком без построчной обработки в psycopg2;
+    polars разбирает его многопоточно сразу в компактные типы. Двоичный формат
+    COPY polars не читает, поэтому используется CSV.
+    """
+    buffer = io.BytesIO()
+    with conn.cursor() as cursor:
+        sql = cursor.mogrify(query, params).decode()
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer)
+    if buffer.tell() == 0:
+        return pd.DataFrame()
+    
+    buffer.seek(0)
+    df = compact_polars(pl.read_csv(buffer, schema_overrides=COPY_SCHEMA_OVERRIDES,
+                                    try_parse_dates=True))
+    buffer.close()
+    return df.to_pandas()
+
+def fetch_readings(conn, start_date, limit_rows, transport=DEFAULT_TRANSPORT, on_progress=None):
+    """Показания с start_date (не более limit_rows строк) выбранным способом
+    
+    transport: 'cursor' - серверный курсор пакетами (stream_query, с прогрессом),
+    'copy' - COPY TO STDOUT + polars (copy_query, быстрее на больших окнах),
+    'pandas' - pd.read_sql_query (прежний способ).
+    """
+    params = (start_date, limit_rows)
+    if transport == 'cursor':
+        return stream_query(conn, READINGS_QUERY, params, on_progress=on_progress)
+    if transport == 'copy':
+        return copy_query(conn, READINGS_QUERY, params)
+    if transport == 'pandas':
+        return pd.read_sql_query(READINGS_QUERY, conn, params=params)
+    raise ValueError(f"Неизвестный способ загрузки: {transport}")
+
+class ResultCache:
+    """Кэш результатов запросов, общий для всех сессий процесса
+    
+    Запись ищется по ключу (параметры запроса) и действительна, пока не изменился
+    водяной знак данных и не истек ttl. При превышении бюджета памяти вытесняются
+    давно не использованные записи (LRU). Кэш хранит свою копию кадра и выдает
+    копии, поэтому изменения кадра в сессии не затрагивают другие сессии.
+    """
+    
+    def __init__(self, max_bytes=RESULT_CACHE_MAX_BYTES, ttl=RESULT_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # key -> (водяной знак, кадр, размер в байтах, время записи)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0,
+                       'expirations': 0, 'evictions': 0}
+    
+    def _drop(self, key):
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def get(self, key, watermark):
+        """Копия кадра из кэша или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_watermark, frame, _, stored_at = entry
+                if time.monotonic() - stored_at > self.ttl:
+                    self._drop(key)
+                    self._stats['expirations'] += 1
+                elif stored_watermark != watermark:
+                    self._drop(key)
+                    self._stats['invalidations'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return frame.copy()
+            self._stats['misses'] += 1
+            return None
+    
+    def put(self, key, watermark, frame):
+        """Сохранение копии кадра; кадр больше всего бюджета не кэшируется"""
+        size = int(frame.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        frame = frame.copy()
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (watermark, frame, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self):
+        """Снимок счетчиков и заполненности кэша"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['max_bytes'] = self.max_bytes
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+            return stats
+
+@st.cache_resource
+def get_result_cache():
+    """Общий кэш результатов процесса"""
+    return ResultCache()
+
+def read_watermark(conn, start_date):
+    """Водяной знак окна показаний: (MAX(created_at), COUNT(*))"""
+    with conn.cursor() as cursor:
+        cursor.execute(WATERMARK_QUERY, (start_date,))
+        watermark = cursor.fetchone()
+    conn.rollback()
+    return watermark
+
 def render_sidebar():
     """Рендеринг боковой панели для загрузки данных из БД"""
     st.sidebar.subheader("📥 Загрузка данных из БД (UC-DAT-01)")
@@ -126,6 +499,13 @@ def render_sidebar():
         )
     
     # Дополнительные параметры
+    transport = st.sidebar.selectbox(
+        "Способ загрузки",
+        list(TRANSPORTS),
+        format_func=TRANSPORTS.get,
+        help="COPY быстрее на больших периодах, серверный курсор показывает прогресс"
+    )
+    
     auto_refresh = st.sidebar.checkbox(
         "Автообновление данных",
         value=False,
@@ -135,39 +515,46 @@ def render_sidebar():
     return {
         'days_back': days_back,
         'limit_rows': limit_rows,
+        'transport': transport,
         'auto_refresh': auto_refresh
     }
 
-def load_data_from_db(days_back=30, limit_rows=100000):
-    """Загрузка и обработка данных из PostgreSQL"""
+def load_data_from_db(days_back=30, limit_rows=100000, transport=DEFAULT_TRANSPORT):
+    """Загрузка и обработка данных из PostgreSQL (transport - см. fetch_readings)"""
     try:
         with st.spinner("📥 Загрузка данных из БД..."):
             conn = get_db_connection()
             if conn is None:
                 return None
             
-            # Рассчитываем дату начала
-            start_date = datetime.now() - timedelta(days=days_back)
+            # Рассчитываем дату начала (по календарным дням - одинаковый ключ кэша в течение дня)
+            start_date = date.today() - timedelta(days=days_back)
+            
+            # Одинаковый запрос при неизменных данных берется из общего кэша
+            cache = get_result_cache()
+            cache_key = (start_date, limit_rows)
+            progress = st.sidebar.progress(0.0, text="📥 Загрузка данных из БД...")
             
-            # SQL запрос для загрузки данных
-            query = """
-            SELECT 
-                management,
-                subscriber_id,
-                meter_id as md_id,
-                reading_date as date,
-                consumption as gas_consumption,
-                data_source as source,
-                created_at
-            FROM gas_readings
-            WHERE reading_date >= %s
-            ORDER BY reading_date DESC
-            LIMIT %s
-            """
+            def report_progress(loaded):
+                progress.progress(min(loaded / limit_rows, 1.0),
+                                  text=f"📥 Загружено {loaded:,} строк")
             
-            # Выполняем запрос
-            df = pd.read_sql_query(query, conn, params=(start_date, limit_rows))
-            conn.close()
+            try:
+                watermark = read_watermark(conn, start_date)
+                df = cache.get(cache_key, watermark)
+                if df is None:
+                    # Выполняем запрос; прогресс пакетов курсора - в боковой панели
+                    df = fetch_readings(conn, start_date, limit_rows, transport,
+                                        on_progress=report_progress)
+                    # Компактная схема: справочники вместо строк, Float32, Date
+                    df = compact_pandas(df)
+                    if not df.empty:
+                        cache.put(cache_key, watermark, df)
+                else:
+                    st.sidebar.info("⚡ Данные взяты из кэша (в БД нет изменений)")
+            finally:
+                release_db_connection(conn)
+                progress.empty()
             
             if df.empty:
                 st.sidebar.warning("⚠️ В БД нет данных за указанный период")
@@ -187,18 +574,10 @@ def load_data_from_db(days_back=30, limit_rows=100000):
             if missing_values > 0:
                 st.sidebar.warning(f"Найдено {missing_values} пропущенных значений.")
             
-            # Преобразование данных
-            df['date_parsed'] = pd.to_datetime(df['date'], errors='coerce')
-            df['gas_consumption'] = pd.to_numeric(df['gas_consumption'], errors='coerce')
+            # Преобразование данных, удаление некорректных строк, дополнительные поля
+            df = add_derived_columns(df)
             
-            # Удаление некорректных данных
-            df = df.dropna(subset=['date_parsed', 'gas_consumption'])
-            
-            # Добавляем дополнительные поля
-            df['year'] = df['date_parsed'].dt.year
-            df['month'] = df['date_parsed'].dt.month
-            df['day'] = df['date_parsed'].dt.day
-            df['weekday'] = df['date_parsed'].dt.weekday
+            bytes_per_row = memory_per_row(df)
             
             # Сохранение в session_state
             st.session_state.df = df
@@ -207,6 +586,8 @@ def load_data_from_db(days_back=30, limit_rows=100000):
             
             st.sidebar.success(f"✅ Данные загружены: {len(df):,} записей")
             st.sidebar.info(f"📊 После обработки: {len(df):,} из {original_rows:,} записей")
+            st.sidebar.info(f"💾 Память: {bytes_per_row:.0f} байт/строку, "
+                            f"{bytes_per_row * len(df) / 1024 ** 2:.1f} МБ")
             
             # Сохраняем метаданные
             st.session_state.data_meta = {
@@ -217,7 +598,12 @@ def load_data_from_db(days_back=30, limit_rows=100000):
                     'max': df['date_parsed'].max()
                 },
                 'unique_subscribers': df['subscriber_id'].nunique(),
-                'unique_managements': df['management'].nunique()
+                'unique_managements': df['management'].nunique(),
+                'bytes_per_row': bytes_per_row,
+                # Для инкрементального обновления (refresh_data_from_db)
+                'watermark': df['created_at'].max(),
+                'start_date': start_date,
+                'limit_rows': limit_rows
             }
             
             return df
@@ -226,6 +612,281 @@ def load_data_from_db(days_back=30, limit_rows=100000):
         st.sidebar.error(f"❌ Ошибка загрузки из БД: {str(e)}")
         return None
 
+def add_derived_columns(df):
+    """Дата показания как datetime64, удаление некорректных строк и календарные поля"""
+    df['date_parsed'] = pd.to_datetime(df['date'], errors='coerce')
+    
+    df = df.dropna(subset=['date_parsed', 'gas_consumption'])
+    
+    df['year'] = df['date_parsed'].dt.year.astype('int16')
+    df['month'] = df['date_parsed'].dt.month.astype('int8')
+    df['day'] = df['date_parsed'].dt.day.astype('int8')
+    df['weekday'] = df['date_parsed'].dt.weekday.astype('int8')
+    return df
+
+def align_categories(df, delta):
+    """Общие справочники категориальных столбцов перед склейкой кадров
+    
+    Новые значения дописываются в конец справочника df, коды существующих строк
+    не меняются. Без этого pd.concat превратил бы столбцы в object.
+    """
+    for column in df.columns:
+        if not isinstance(df[column].dtype, pd.CategoricalDtype) or column not in delta:
+            continue
+        new_values = pd.Index(delta[column].unique()).dropna().difference(df[column].cat.categories)
+        if len(new_values):
+            df[column] = df[column].cat.add_categories(new_values)
+        delta[column] = delta[column].astype(df[column].dtype)
+    return df, delta
+
+def refresh_data_from_db(days_back=30, limit_rows=100000, transport=DEFAULT_TRANSPORT):
+    """Инкрементальное обновление загруженных данных
+    
+    Из БД читаются только строки с created_at не раньше водяного знака прошлой
+    загрузки минус DELTA_OVERLAP; они заменяют строки с тем же абонентом, прибором
+    и датой или добавляются. Строки, вышедшие за окно days_back, отбрасываются. Производные
+    поля считаются только для новых строк. Если окно расширилось, изменился лимит
+    или данных еще нет - выполняется полная загрузка (load_data_from_db).
+    Удаления в БД инкрементально не отслеживаются.
+    """
+    df = st.session_state.get('df')
+    meta = st.session_state.get('data_meta')
+    start_date = date.today() - timedelta(days=days_back)
+    
+    if (df is None or meta is None or pd.isna(meta.get('watermark'))
+            or meta.get('limit_rows') != limit_rows or start_date < meta['start_date']):
+        return load_data_from_db(days_back, limit_rows, transport)
+    
+    try:
+        conn = get_db_connection()
+        if conn is None:
+            return None
+        try:
+            delta = stream_query(conn, DELTA_QUERY,
+                                 (meta['watermark'] - DELTA_OVERLAP, start_date))
+        finally:
+            release_db_connection(conn)
+        
+        added = replaced = 0
+        if not delta.empty:
+            # Повторы ключа в приращении - остается последняя запись (по created_at)
+            delta = add_derived_columns(
+                compact_pandas(delta).drop_duplicates(READING_KEY, keep='last')
+            )
+            
+            # Заменяемые строки ищем только среди дат, встречающихся в приращении
+            recent = (df['date_parsed'] >= delta['date_parsed'].min()).to_numpy()
+            recent_keys = pd.MultiIndex.from_frame(df.loc[recent, READING_KEY])
+            delta_keys = pd.MultiIndex.from_frame(delta[READING_KEY])
+            is_replaced = np.zeros(len(df), dtype=bool)
+            is_replaced[recent] = recent_keys.isin(delta_keys)
+            # Строки перекрытия, уже загруженные прошлым обновлением, не считаются заменой
+            is_loaded = delta_keys.isin(recent_keys)
+            added = int((~is_loaded).sum())
+            replaced = int((is_loaded & (delta['created_at'] > meta['watermark']).to_numpy()).sum())
+            
+            df, delta = align_categories(df[~is_replaced].copy(), delta)
+            df = pd.concat([delta, df], ignore_index=True)
+        
+        # Строки, вышедшие за окно, и сверх лимита (оставляем самые свежие)
+        outside = df['date_parsed'] < pd.Timestamp(start_date)
+        dropped = int(outside.sum())
+        if dropped:
+            df = df[~outside]
+        if len(df) > limit_rows:
+            dropped += len(df) - limit_rows
+            df = df.sort_values('date_parsed', ascending=False, kind='stable').head(limit_rows)
+        
+        st.session_state.df = df
+        st.session_state.last_update = datetime.now()
+        
+        meta = dict(meta)
+        if not delta.empty:
+            meta['watermark'] = max(meta['watermark'], delta['created_at'].max())
+            meta['date_range'] = {
+                'min': meta['date_range']['min'],
+                'max': max(meta['date_range']['max'], delta['date_parsed'].max())
+            }
+            meta['unique_subscribers'] = df['subscriber_id'].nunique()
+            meta['unique_managements'] = df['management'].nunique()
+        if dropped:
+            meta['date_range'] = {'min': df['date_parsed'].min(), 'max': meta['date_range']['max']}
+        meta.update({
+            'loaded_at': datetime.now(),
+            'total_records': len(df),
+            'start_date': start_date,
+            'bytes_per_row': memory_per_row(df)
+        })
+        st.session_state.data_meta = meta
+        
+        st.sidebar.success(f"🔄 Обновлено: новых {added:,}, заменено {replaced:,}, "
+                           f"вне окна {dropped:,}")
+        return df
+    
+    except Exception as e:
+        st.sidebar.error(f"❌ Ошибка обновления из БД: {str(e)}")
+        return None
+
+def aggregate_in_pandas(name, df, date_from, date_to, management):
+    """Те же агрегаты по загруженному кадру (если БД недоступна)"""
+    mask = pd.Series(True, index=df.index)
+    if date_from is not None:
+        mask &= df['date_parsed'] >= pd.Timestamp(date_from)
+    if date_to is not None:
+        mask &= df['date_parsed'] < pd.Timestamp(date_to)
+    if management is not None:
+        mask &= df['management'] == management
+    df = df[mask]
+    
+    if name == 'daily_management':
+        return (df.groupby(['date_parsed', 'management'], observed=True)['gas_consumption']
+                .sum().reset_index())
+    if name == 'subscriber_stats':
+        return (df.groupby('subscriber_id', observed=True)['gas_consumption']
+                .agg(['mean', 'sum', 'std', 'count']).reset_index())
+    if name == 'subscriber_monthly':
+        return (df.groupby(['subscriber_id', df['date_parsed'].dt.month.rename('month')],
+                           observed=True)['gas_consumption']
+                .mean().rename('mean').reset_index())
+    raise ValueError(f"Неизвестный агрегат: {name}")
+
+def rollups_ready(conn):
+    """Сводные таблицы есть и дозагружены по строкам gas_readings новее водяного знака
+    
+    gas_readings пишет не MeterDataImporter, поэтому перед чтением сводок
+    дозагружаются строки, записанные после прошлого пересчета (RollupManager.
+    refresh_new_rows; без новых строк - одна проверка по индексу created_at).
+    Если дозагрузка не удалась, агрегат читается из gas_readings.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(ROLLUPS_AVAILABLE_QUERY)
+        available = cursor.fetchone()[0]
+    conn.rollback()
+    if not available:
+        return False
+    try:
+        RollupManager(conn, source='gas_readings').refresh_new_rows()
+        return True
+    except Exception as e:
+        conn.rollback()
+        st.warning(f"Сводные таблицы не обновлены, агрегат читается из gas_readings: {str(e)}")
+        return False
+
+def select_aggregate_query(name, params, use_rollups):
+    """Запрос агрегата: по сводным таблицам, если они есть и подходят к периоду
+    
+    Дневные суммы точны для любого периода, помесячные сводки по абонентам - если
+    границы периода начала месяцев (или открыты).
+    """
+    bounds = (params['date_from'], params['date_to'])
+    rollup_fits = name == 'daily_management' or all(
+        bound in (date.min, date.max) or bound.day == 1 for bound in bounds
+    )
+    if rollup_fits and use_rollups:
+        if name == 'subscriber_stats' and bounds == (date.min, date.max):
+            return ROLLUP_QUERIES['subscriber_lifetime']
+        return ROLLUP_QUERIES[name]
+    return AGGREGATE_QUERIES[name]
+
+def run_aggregate(name, df, date_from=None, date_to=None, management=None, full_history=False):
+    """Агрегат из AGGREGATE_QUERIES за период [date_from, date_to)
+    
+    Для данных, загруженных из БД, агрегат считает PostgreSQL: во вкладку приходят
+    килобайты вместо всех строк окна. Без date_from берется начало загруженного окна,
+    а при full_history - начало всей истории в БД, если есть сводные таблицы
+    (src/database/rollups.py): без них GROUP BY по всей истории gas_readings слишком
+    дорог, и берется загруженное окно. Сводные таблицы читаются вместо gas_readings.
+    Результат кэшируется в общем кэше до следующей загрузки или обновления данных.
+    Если данные загружены не из БД или запрос не удался, агрегат считается по df.
+    """
+    meta = st.session_state.get('data_meta') or {}
+    if meta.get('start_date') is not None:
+        conn = get_db_connection()
+        if conn is not None:
+            try:
+                use_rollups = rollups_ready(conn)
+                params = {
+                    'date_from': date_from or (date.min if full_history and use_rollups
+                                               else meta['start_date']),
+                    'date_to': date_to or date.max,
+                    'management': management,
+                }
+                # Ключ - фактическое окно запроса: начало загруженного окна меняется
+                # при перезагрузке, а с rollups и без них считаются разные окна
+                cache = get_result_cache()
+                cache_key = (name, params['date_from'], params['date_to'], management, use_rollups)
+                watermark = (meta.get('watermark'), meta.get('total_records'))
+                result = cache.get(cache_key, watermark)
+                if result is not None:
+                    return result
+                
+                query = select_aggregate_query(name, params, use_rollups)
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params)
+                    result = pd.DataFrame(cursor.fetchall(),
+                                          columns=[column[0] for column in cursor.description])
+                if 'date_parsed' in result:
+                    result['date_parsed'] = pd.to_datetime(result['date_parsed'])
+                cache.put(cache_key, watermark, result)
+                return result
+            except Exception as e:
+                st.warning(f"Агрегат {name} посчитан по загруженным данным: {str(e)}")
+            finally:
+                release_db_connection(conn)
+    
+    return aggregate_in_pandas(name, df, date_from, date_to, management)
+
+def daily_management_totals(df, date_from=None, date_to=None, management=None):
+    """Потребление по дням и управлениям: date_parsed, management, gas_consumption"""
+    return run_aggregate('daily_management', df, date_from, date_to, management)
+
+def subscriber_stats(df, date_from=None, date_to=None, full_history=False):
+    """Статистика по абонентам: subscriber_id, mean, sum, std, count"""
+    return run_aggregate('subscriber_stats', df, date_from, date_to, full_history=full_history)
+
+def subscriber_monthly_means(df, date_from=None, date_to=None, full_history=False):
+    """Среднее потребление абонентов по месяцам: subscriber_id, month, mean"""
+    return run_aggregate('subscriber_monthly', df, date_from, date_to, full_history=full_history)
+
+def combine_subscriber_stats(*frames):
+    """Объединение статистик subscriber_stats за непересекающиеся периоды
+    
+    Среднее и стандартное отклонение складываются через суммы и суммы квадратов
+    (std одиночного показания - NaN - дает нулевой вклад).
+    """
+    stats = pd.concat(frames, ignore_index=True)
+    count = stats['count'].astype(float)
+    total = stats['sum'].astype(float)
+    std = stats['std'].astype(float).fillna(0)
+    parts = pd.DataFrame({
+        'subscriber_id': stats['subscriber_id'].astype(str),
+        'sum': total,
+        'sq_sum': std ** 2 * (count - 1) + total ** 2 / count,
+        'count': count,
+    }).groupby('subscriber_id', sort=True).sum()
+    
+    variance = (parts['sq_sum'] - parts['sum'] ** 2 / parts['count']) / (parts['count'] - 1)
+    return pd.DataFrame({
+        'subscriber_id': parts.index,
+        'mean': (parts['sum'] / parts['count']).to_numpy(),
+        'sum': parts['sum'].to_numpy(),
+        'std': np.sqrt(variance.clip(lower=0)).where(parts['count'] > 1).to_numpy(),
+        'count': parts['count'].astype('int64').to_numpy(),
+    })
+
+def subscriber_baseline_stats(df, date_to):
+    """Статистика абонентов за всю историю до date_to (не включая)
+    
+    Целые месяцы до начала месяца date_to читаются из помесячных сводок (если они
+    есть), неполный месяц [начало месяца, date_to) - запросом по показаниям.
+    """
+    month = date_to.replace(day=1)
+    whole_months = subscriber_stats(df, date_to=month, full_history=True)
+    if month == date_to:
+        return whole_months
+    partial_month = subscriber_stats(df, date_from=month, date_to=date_to)
+    return combine_subscriber_stats(whole_months, partial_month)
+
 def get_available_managements():
     """Получение списка доступных управлений из БД"""
     try:
@@ -233,36 +894,103 @@ def get_available_managements():
         if conn is None:
             return []
         
-        query = "SELECT DISTINCT management FROM gas_readings ORDER BY management"
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        try:
+            df = pd.read_sql_query(MANAGEMENTS_QUERY, conn)
+        finally:
+            release_db_connection(conn)
         
         return df['management'].tolist()
     except:
         return []
 
-def get_subscriber_data(subscriber_id):
-    """Получение данных по конкретному абоненту"""
+def subscriber_history_query(columns):
+    """SUBSCRIBER_HISTORY_QUERY с выбранными столбцами из SUBSCRIBER_HISTORY_COLUMNS"""
+    unknown = set(columns) - SUBSCRIBER_HISTORY_COLUMNS.keys()
+    if unknown:
+        raise ValueError(f"Неизвестные столбцы истории: {', '.join(sorted(unknown))}")
+    return SUBSCRIBER_HISTORY_QUERY.format(columns=",\n    ".join(
+        f"{SUBSCRIBER_HISTORY_COLUMNS[column]} as {column}" for column in columns
+    ))
+
+def fetch_subscribers_history(conn, subscriber_ids, columns=('md_id', 'gas_consumption'),
+                              date_from=None, page_size=FETCH_BATCH_SIZE):
+    """История нескольких абонентов одним запросом на страницу
+    
+    Страницы по page_size строк продолжаются с последнего ключа (subscriber_id,
+    reading_date, id) предыдущей страницы, поэтому длинная история не читается
+    через OFFSET и не упирается в LIMIT. Возвращает один кадр, упорядоченный по
+    абоненту и дате (subscriber_id - category): subscriber_id, date и columns.
+    """
+    query = subscriber_history_query(columns)
+    remaining = sorted({str(subscriber_id) for subscriber_id in subscriber_ids})
+    after = ('', date.min, 0)
+    batches = []
+    with conn.cursor() as cursor:
+        while remaining:
+            cursor.execute(query, {
+                'subscriber_ids': remaining,
+                'date_from': date_from or date.min,
+                'page_size': page_size,
+                'after_subscriber': after[0],
+                'after_date': after[1],
+                'after_id': after[2],
+            })
+            rows = cursor.fetchall()
+            if rows:
+                batches.append(rows_to_record_batch([c[0] for c in cursor.description], rows))
+            if len(rows) < page_size:
+                break
+            # Уже прочитанные абоненты из массива убираются: индекс не спускается к ним.
+            # Убираются только встреченные на страницах (кроме последнего - его история
+            # может продолжиться): порядок строк Python и сортировка БД могут не совпадать
+            done = {row[0] for row in rows}
+            done.add(after[0])
+            after = (rows[-1][0], rows[-1][1], rows[-1][-1])
+            done.discard(after[0])
+            remaining = [s for s in remaining if s not in done]
+    
+    df = batches_to_frame(batches)
+    if df.empty:
+        return pd.DataFrame(columns=['subscriber_id', 'date', *columns])
+    return df.drop(columns='reading_id')
+
+def get_subscribers_history(subscriber_ids, columns=('md_id', 'gas_consumption'), date_from=None):
+    """История выбранных абонентов (например, из списка аномалий или кластера)
+    
+    Вместо запроса на каждого абонента - один постраничный запрос на всех
+    (см. fetch_subscribers_history); результат кэшируется до обновления данных.
+    Кадр сгруппирован по абоненту: df.groupby('subscriber_id', observed=True).
+    """
+    meta = st.session_state.get('data_meta') or {}
+    cache = get_result_cache()
+    cache_key = ('subscribers_history',
+                 tuple(sorted({str(subscriber_id) for subscriber_id in subscriber_ids})),
+                 tuple(columns), date_from)
+    watermark = (meta.get('watermark'), meta.get('total_records'))
+    result = cache.get(cache_key, watermark)
+    if result is not None:
+        return result
+    
     try:
         conn = get_db_connection()
         if conn is None:
             return None
         
-        query = """
-        SELECT * FROM gas_readings 
-        WHERE subscriber_id = %s 
-        ORDER BY reading_date DESC
-        LIMIT 1000
-        """
-        
-        df = pd.read_sql_query(query, conn, params=(subscriber_id,))
-        conn.close()
+        try:
+            df = fetch_subscribers_history(conn, subscriber_ids, columns, date_from)
+        finally:
+            release_db_connection(conn)
         
+        cache.put(cache_key, watermark, df)
         return df
     except Exception as e:
-        st.error(f"Ошибка получения данных абонента: {str(e)}")
+        st.error(f"Ошибка получения истории абонентов: {str(e)}")
         return None
 
+def get_subscriber_data(subscriber_id):
+    """Получение всей истории конкретного абонента (см. get_subscribers_history)"""
+    return get_subscribers_history([subscriber_id], columns=tuple(SUBSCRIBER_HISTORY_COLUMNS))
+
 def save_analysis_results(results, analysis_type):
     """Сохранение результатов анализа в БД"""
     try:
@@ -270,30 +998,20 @@ def save_analysis_results(results, analysis_type):
         if conn is None:
             return False
         
-        cursor = conn.cursor()
-        
-        # Создание таблицы для результатов анализа, если её нет
-        create_table_query = """
-        CREATE TABLE IF NOT EXISTS analysis_results (
-            id SERIAL PRIMARY KEY,
-            analysis_type VARCHAR(50),
-            subscriber_id VARCHAR(50),
-            cluster_id INTEGER,
-            anomaly_score FLOAT,
-            forecast_value FLOAT,
-            confidence_interval JSON,
-            analysis_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            metadata JSON
-        )
-        """
-        cursor.execute(create_table_query)
-        
-        # Здесь должна быть логика сохранения конкретных результатов
-        # В зависимости от analysis_type
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            
+            # Создание таблицы для результатов анализа, если её нет
+            # (схема и индексы - src/database/migrations.py)
+            cursor.execute(ANALYSIS_RESULTS_DDL)
+            
+            # Здесь должна быть логика сохранения конкретных результатов
+            # В зависимости от analysis_type
+            
+            conn.commit()
+            cursor.close()
+        finally:
+            release_db_connection(conn)
         
         return True
         
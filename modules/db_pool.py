@@ -0,0 +1,229 @@
+# modules/db_pool.py
+import streamlit as st
+import psycopg2
+import psycopg2.extensions
+import threading
+import time
+import os
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+from src.database.connection import connect_from_env
+
+# Загрузка переменных окружения
+load_dotenv()
+
+# Параметры пула (переменные окружения DB_POOL_*)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX", "10"))
+# Соединения сверх минимума, простаивающие дольше, закрываются (секунды)
+POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))
+# Простаивавшее дольше соединение проверяется запросом SELECT 1 перед выдачей
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK", "30"))
+# Максимальное ожидание свободного соединения
+POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+
+class PoolTimeout(Exception):
+    """Свободное соединение не появилось за отведенное время"""
+
+
+class ConnectionPool:
+    """Пул соединений PostgreSQL, общий для всех сессий процесса Streamlit
+
+    При исчерпании max_size запрос соединения ждет его возврата (не более
+    timeout секунд). Перед выдачей долго простаивавшее соединение проверяется,
+    закрытое или неисправное заменяется новым. Простаивающие сверх min_size
+    соединения закрываются через idle_timeout. Время ожидания выдачи
+    накапливается в статистике (stats). Соединения создает connect, если
+    он задан, иначе psycopg2.connect(**connect_kwargs).
+    """
+
+    def __init__(self, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 idle_timeout=POOL_IDLE_TIMEOUT,
+                 health_check_interval=POOL_HEALTH_CHECK_INTERVAL,
+                 timeout=POOL_CHECKOUT_TIMEOUT, connect=None, **connect_kwargs):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs
+        self.connect = connect
+
+        self._cond = threading.Condition()
+        # Свободные соединения: (соединение, время возврата)
+        self._idle = deque()
+        self._in_use = set()
+        # Места, зарезервированные под соединения, которые создаются вне блокировки
+        self._pending = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'health_check_failures': 0,
+        }
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._stats['created'] += 1
+
+    def _connect(self):
+        if self.connect is not None:
+            return self.connect()
+        return psycopg2.connect(**self.connect_kwargs)
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _prune_idle(self, now):
+        """Закрытие соединений, простаивающих дольше idle_timeout (сверх min_size)"""
+        while (self._idle and len(self._idle) + len(self._in_use) + self._pending > self.min_size
+               and now - self._idle[0][1] > self.idle_timeout):
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+            self._stats['recycled'] += 1
+
+    def getconn(self, timeout=None):
+        """Выдача соединения; при исчерпании пула - ожидание возврата
+
+        Под блокировкой только выбирается свободное соединение или резервируется
+        место под новое. Подключение и проверка SELECT 1 выполняются вне
+        блокировки, чтобы медленная БД не задерживала putconn и другие потоки.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        waited = False
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    self._prune_idle(now)
+
+                    if self._idle:
+                        # Последнее возвращенное соединение - самое "теплое"
+                        conn, returned_at = self._idle.pop()
+                        self._in_use.add(conn)
+                        idle_for = now - returned_at
+                        break
+
+                    if len(self._in_use) + self._pending < self.max_size:
+                        self._pending += 1
+                        break
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"Нет свободного соединения за {timeout:.1f} с "
+                            f"(занято {len(self._in_use)} из {self.max_size})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                # Место зарезервировано: подключаемся без блокировки
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._pending -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._pending -= 1
+                    self._in_use.add(conn)
+                    self._stats['created'] += 1
+            elif not self._is_healthy(conn, idle_for):
+                self._close(conn)
+                with self._cond:
+                    self._in_use.discard(conn)
+                    self._stats['health_check_failures'] += 1
+                    self._cond.notify()
+                continue
+
+            with self._cond:
+                wait_time = time.monotonic() - started
+                self._stats['checkouts'] += 1
+                self._stats['wait_total'] += wait_time
+                self._stats['wait_max'] = max(self._stats['wait_max'], wait_time)
+                if waited:
+                    self._stats['waits'] += 1
+            return conn
+
+    def putconn(self, conn):
+        """Возврат соединения в пул; незавершенная транзакция откатывается
+
+        Откат и закрытие - вне блокировки (соединение до конца отката считается
+        занятым), под блокировкой оно только возвращается в список свободных.
+        """
+        reusable = False
+        if not conn.closed:
+            try:
+                status = conn.get_transaction_status()
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                reusable = True
+            except Exception:
+                self._close(conn)
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if reusable:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """with pool.connection() as conn: ... - соединение возвращается при выходе"""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def stats(self):
+        """Снимок статистики пула"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = len(self._in_use)
+            stats['wait_avg'] = stats['wait_total'] / stats['checkouts'] if stats['checkouts'] else 0.0
+            return stats
+
+    def closeall(self):
+        """Закрытие всех свободных соединений"""
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.popleft()[0])
+
+
+@st.cache_resource
+def get_pool():
+    """Общий пул процесса: создается один раз и переживает перезапуски скрипта"""
+    return ConnectionPool(connect=connect_from_env)
@@ -4,6 +4,8 @@ import pandas as pd
 import plotly.express as px
 import io
 import base64
+from datetime import timedelta
+from modules.db_loader import daily_management_totals
 from utils.visualization import create_consumption_chart
 
 def render(df):
@@ -42,7 +44,7 @@ def render(df):
     render_metrics(filtered_df)
     
     # График потребления
-    render_consumption_chart(filtered_df)
+    render_consumption_chart(filtered_df, management_filter, date_range)
     
     # Предпросмотр данных
     render_data_preview(filtered_df)
@@ -82,12 +84,17 @@ def render_metrics(filtered_df):
         avg_consumption = filtered_df['gas_consumption'].mean()
         st.metric("Среднее потребление", f"{avg_consumption:,.1f} м³")
 
-def render_consumption_chart(filtered_df):
+def render_consumption_chart(filtered_df, management_filter="Все", date_range=()):
     """Отображение графика потребления"""
     st.subheader("📊 График потребления")
     
-    # Агрегация по дате
-    daily_data = filtered_df.groupby('date_parsed')['gas_consumption'].sum().reset_index()
+    # Агрегация по дате (в БД - суммы по дням и управлениям за выбранный период)
+    date_from = date_to = None
+    if len(date_range) == 2:
+        date_from, date_to = date_range[0], date_range[1] + timedelta(days=1)
+    management = None if management_filter == "Все" else management_filter
+    daily_totals = daily_management_totals(filtered_df, date_from, date_to, management)
+    daily_data = daily_totals.groupby('date_parsed')['gas_consumption'].sum().reset_index()
     
     fig = create_consumption_chart(daily_data)
     st.plotly_chart(fig, use_container_width=True)
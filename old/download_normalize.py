@@ -5,6 +5,8 @@ from datetime import datetime
 import locale
 import os
 
+from src.data_processing.compact import compact_pandas, memory_per_row
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -92,6 +94,10 @@ def normalize_data(df):
     # Сортируем по дате
     df_normalized = df_normalized.sort_values('date')
     
+    # Компактные типы: категории, Float32, малые целые, дата - date32
+    df_normalized = compact_pandas(df_normalized)
+    logger.info(f"Память: {memory_per_row(df_normalized):.0f} байт/строку")
+    
     return df_normalized
 
 def main():
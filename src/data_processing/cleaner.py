@@ -1,18 +1,28 @@
 import polars as pl
 import numpy as np
+from typing import Union
 
 class GasDataCleaner:
     @staticmethod
-    def clean_data(df: pl.DataFrame) -> pl.DataFrame:
-        """Основная функция очистки данных"""
+    def clean_data(
+        df: Union[pl.DataFrame, pl.LazyFrame]
+    ) -> Union[pl.DataFrame, pl.LazyFrame]:
+        """Основная функция очистки данных
+        
+        Принимает DataFrame или LazyFrame и возвращает результат того же вида:
+        для LazyFrame шаги очистки только добавляются в план запроса.
+        """
         # Создаем копию
         df_clean = df.clone()
         
-        # Преобразуем дату
+        # Преобразуем дату (в очищенном Parquet она уже имеет тип Date)
+        if df_clean.collect_schema()["date"] == pl.Date:
+            date_norm = pl.col("date")
+        else:
+            date_norm = pl.col("date").str.strptime(pl.Date, format="%d.%m.%Y")
+        
         df_clean = df_clean.with_columns([
-            pl.col("date")
-            .str.strptime(pl.Date, format="%d.%m.%Y")
-            .alias("date_norm")
+            date_norm.alias("date_norm")
         ])
         
         # Конвертируем потребление в число
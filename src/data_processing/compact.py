@@ -0,0 +1,112 @@
+import polars as pl
+import pandas as pd
+import numpy as np
+from typing import Union
+
+# Компактная схема кадров показаний, общая для всех загрузчиков:
+# - повторяющиеся строки (управление, источник, ID абонента) хранятся словарем:
+#   целочисленные коды в столбце + справочник значений (pandas category / polars Categorical);
+# - ID прибора - наименьший целый тип, вмещающий значения;
+# - потребление - Float32, дата показания - Date (4 байта), календарные поля - Int8/Int16.
+CATEGORY_COLUMNS = ["management", "source", "subscriber_id", "season", "month_name"]
+ID_COLUMNS = ["md_id"]
+CONSUMPTION_COLUMN = "gas_consumption"
+CALENDAR_DTYPES = {
+    "year": "int16",
+    "month": "int8",
+    "day": "int8",
+    "weekday": "int8",
+    "quarter": "int8",
+    "heating_season": "int8",
+}
+POLARS_CALENDAR_DTYPES = {
+    "year": pl.Int16,
+    "month": pl.Int8,
+    "day": pl.Int8,
+    "weekday": pl.Int8,
+    "quarter": pl.Int8,
+    "heating_season": pl.Int8,
+}
+
+
+def compact_pandas(df: pd.DataFrame, date_columns=("date",)) -> pd.DataFrame:
+    """Приведение pandas-кадра показаний к компактной схеме (на месте, возвращает df)
+
+    date_columns: столбцы с датой без времени, хранятся как date32 (Arrow).
+    Столбцы datetime64, с которыми вкладки дашборда ведут арифметику дат
+    (date_parsed), не меняются.
+    """
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+
+    for column in ID_COLUMNS:
+        if column not in df.columns:
+            continue
+        if pd.api.types.is_numeric_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+        else:
+            df[column] = df[column].astype("category")
+
+    if CONSUMPTION_COLUMN in df.columns:
+        df[CONSUMPTION_COLUMN] = pd.to_numeric(df[CONSUMPTION_COLUMN], errors="coerce").astype("float32")
+
+    for column in date_columns:
+        if column in df.columns and not isinstance(df[column].dtype, pd.ArrowDtype):
+            df[column] = pd.to_datetime(df[column], errors="coerce").astype("date32[pyarrow]")
+
+    for column, dtype in CALENDAR_DTYPES.items():
+        if column in df.columns and df[column].notna().all():
+            df[column] = df[column].astype(dtype)
+
+    return df
+
+
+def compact_polars(
+    df: Union[pl.DataFrame, pl.LazyFrame]
+) -> Union[pl.DataFrame, pl.LazyFrame]:
+    """Приведение polars-кадра показаний к компактной схеме
+
+    Для LazyFrame преобразования добавляются в план. Дата в виде строки
+    DD.MM.YYYY разбирается в Date, нераспознанные значения становятся null.
+    """
+    schema = df.collect_schema()
+    expressions = []
+
+    for column in CATEGORY_COLUMNS:
+        if column in schema and schema[column] == pl.Utf8:
+            expressions.append(pl.col(column).cast(pl.Categorical))
+
+    for column in ID_COLUMNS:
+        # Диапазон значений известен только для загруженного кадра
+        if (column in schema and schema[column].is_integer()
+                and isinstance(df, pl.DataFrame) and fits_int32(df[column])):
+            expressions.append(pl.col(column).cast(pl.Int32))
+
+    if CONSUMPTION_COLUMN in schema and schema[CONSUMPTION_COLUMN] != pl.Float32:
+        expressions.append(pl.col(CONSUMPTION_COLUMN).cast(pl.Float32))
+
+    if "date" in schema and schema["date"] == pl.Utf8:
+        expressions.append(pl.col("date").str.strptime(pl.Date, format="%d.%m.%Y", strict=False))
+
+    for column, dtype in POLARS_CALENDAR_DTYPES.items():
+        if column in schema and schema[column].is_integer():
+            expressions.append(pl.col(column).cast(dtype))
+
+    return df.with_columns(expressions) if expressions else df
+
+
+def fits_int32(series: pl.Series) -> bool:
+    """Помещаются ли целые значения столбца в Int32"""
+    low, high = series.min(), series.max()
+    limits = np.iinfo(np.int32)
+    return low is None or (low >= limits.min and high <= limits.max)
+
+
+def memory_per_row(df: Union[pl.DataFrame, pd.DataFrame]) -> float:
+    """Память кадра в байтах на строку (для pandas - с учетом объектов Python)"""
+    if isinstance(df, pl.DataFrame):
+        total, rows = df.estimated_size(), df.height
+    else:
+        total, rows = df.memory_usage(deep=True).sum(), len(df)
+    return total / rows if rows else 0.0
@@ -1,9 +1,16 @@
 import polars as pl
+from typing import Union
 
 class FeatureEngineer:
     @staticmethod
-    def create_customer_features(df: pl.DataFrame) -> pl.DataFrame:
-        """Создание признаков на уровне абонента"""
+    def create_customer_features(
+        df: Union[pl.DataFrame, pl.LazyFrame]
+    ) -> Union[pl.DataFrame, pl.LazyFrame]:
+        """Создание признаков на уровне абонента
+        
+        LazyFrame (например, из GasDataLoader.scan_directory) остается ленивым:
+        агрегация выполняется одним планом при collect().
+        """
         # Сначала собираем все агрегации, кроме тех, что зависят от других
         customer_features = df.group_by("subscriber_id").agg([
             pl.col("gas_consumption").mean().alias("mean_consumption"),
@@ -17,7 +24,7 @@ class FeatureEngineer:
             .alias("cv_consumption"),
             
             # Количество записей
-            pl.count().alias("n_records"),
+            pl.len().alias("n_records"),
             
             # Период наблюдения
             (pl.col("date_norm").max() - pl.col("date_norm").min())
@@ -38,16 +45,17 @@ class FeatureEngineer:
         
         # Теперь вычисляем производные признаки
         customer_features = customer_features.with_columns([
-            # Отношение зимнее/летнее (защита от деления на 0)
+            # Отношение зимнее/летнее (защита от деления на 0). NaN заполняется
+            # сразу: в сравнениях polars NaN больше любого числа и дал бы "high"
             pl.when(pl.col("summer_mean") > 0)
                 .then(pl.col("winter_mean") / pl.col("summer_mean"))
                 .otherwise(pl.lit(1.0))
+                .fill_nan(1.0)
                 .alias("seasonality_ratio"),
             
             # Заполняем NaN значения
             pl.col("winter_mean").fill_nan(0),
             pl.col("summer_mean").fill_nan(0),
-            pl.col("seasonality_ratio").fill_nan(1.0),
         ])
         
         # Добавляем категорию сезонности
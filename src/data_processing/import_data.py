@@ -1,7 +1,24 @@
 import psycopg2
+from psycopg2.extras import execute_batch, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 import pandas as pd
 from datetime import datetime
+import gzip
+import io
 import os
+import re
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from src.data_processing.manifest import (
+    DEFAULT_MANIFEST_PATH, FILE_CHANGED, FILE_UNCHANGED,
+    ImportManifest, merge_month_digests, month_digests
+)
+from src.database.partitions import PartitionManager
+from src.database.rollups import (
+    CHANGES_TABLE, READINGS_SUBSCRIBER_KEY, RollupManager, readings_subscriber_id
+)
 
 # Конфигурация БД
 DB_CONFIG = {
@@ -11,10 +28,57 @@ DB_CONFIG = {
     'port': '5432'
 }
 
+# Размер пакета строк, читаемых из CSV за один раз
+DEFAULT_BATCH_SIZE = 100_000
+
+# Временная таблица для массовой загрузки через COPY
+STAGING_TABLE = 'import_staging'
+
+STAGING_COLUMNS = ['row_num', 'location', 'meter_code', 'meter_serial',
+                   'reading_date', 'value', 'reading_type']
+
+# Контрольные точки импорта: номер первой незафиксированной строки каждого файла
+CHECKPOINT_TABLE = 'import_checkpoints'
+
+# Отклоненные строки пишутся рядом с исходным файлом: data.csv -> data.rejects.csv
+REJECTS_SUFFIX = '.rejects.csv'
+
+# Экспорт: COPY TO STDOUT потоком в файл, сжатие определяется по расширению
+EXPORT_QUERY = """
+    SELECT
+        location_name,
+        meter_code,
+        meter_serial,
+        TO_CHAR(reading_date, 'DD.MM.YYYY') as reading_date,
+        value,
+        reading_type
+    FROM v_full_readings
+"""
+EXPORT_COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+EXPORT_WORKERS = 4
+COPY_BUFFER_SIZE = 1024 * 1024
+
 class MeterDataImporter:
-    def __init__(self):
+    def __init__(self, manifest_path=DEFAULT_MANIFEST_PATH):
         self.conn = None
+        # Журнал загруженных файлов: неизменные файлы пропускаются, измененные
+        # перезагружаются только за месяцы, в которых поменялись строки
+        self.manifest = ImportManifest(manifest_path, consumer='meter_import')
+        # Справочники в памяти: location_name -> id, (meter_code, location_id) -> (id, meter_serial)
+        self.location_cache = {}
+        self.meter_cache = {}
         self.connect()
+        # Если readings секционирована по месяцам (python -m src.database.partitions),
+        # недостающие секции создаются перед записью пакета
+        self.partitions = PartitionManager(self.conn)
+        self.readings_partitioned = self.partitions.is_partitioned('readings')
+        self.conn.commit()
+        # Сводные таблицы (src/database/rollups.py) обновляются в транзакции каждого
+        # пакета на разность новых и прежних значений показаний
+        self.rollups = RollupManager(self.conn, source='readings')
+        self.rollups.create_tables()
+        self.create_checkpoint_table()
+        self.load_dimension_cache()
     
     def connect(self):
         """Подключение к базе данных"""
@@ -30,6 +94,156 @@ class MeterDataImporter:
         """Закрытие соединения"""
         if self.conn:
             self.conn.close()
+        self.manifest.close()
+    
+    def create_checkpoint_table(self):
+        """Создание таблицы контрольных точек импорта"""
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+                file_path TEXT PRIMARY KEY,
+                file_size BIGINT NOT NULL,
+                file_mtime_ns BIGINT NOT NULL,
+                next_row BIGINT NOT NULL,
+                imported BIGINT NOT NULL,
+                rejected BIGINT NOT NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """)
+        self.conn.commit()
+    
+    def load_checkpoint(self, file_path):
+        """Контрольная точка незавершенного импорта файла: (next_row, imported, rejected)
+        
+        Точка, записанная для другой версии файла (размер или mtime не совпадают),
+        удаляется, и импорт начинается с начала.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(f"""
+            SELECT file_size, file_mtime_ns, next_row, imported, rejected
+            FROM {CHECKPOINT_TABLE} WHERE file_path = %s
+        """, (os.path.abspath(file_path),))
+        row = cursor.fetchone()
+        
+        checkpoint = None
+        if row is not None:
+            stat = os.stat(file_path)
+            if (row[0], row[1]) == (stat.st_size, stat.st_mtime_ns):
+                checkpoint = row[2:]
+            else:
+                self.clear_checkpoint(cursor, file_path)
+        self.conn.commit()
+        return checkpoint
+    
+    def save_checkpoint(self, cursor, file_path, next_row, imported, rejected):
+        """Запись контрольной точки в текущей транзакции (вместе с пакетом данных)"""
+        stat = os.stat(file_path)
+        cursor.execute(f"""
+            INSERT INTO {CHECKPOINT_TABLE}
+                (file_path, file_size, file_mtime_ns, next_row, imported, rejected)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (file_path) DO UPDATE SET
+                file_size = EXCLUDED.file_size,
+                file_mtime_ns = EXCLUDED.file_mtime_ns,
+                next_row = EXCLUDED.next_row,
+                imported = EXCLUDED.imported,
+                rejected = EXCLUDED.rejected,
+                updated_at = now()
+        """, (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns,
+              next_row, imported, rejected))
+    
+    def clear_checkpoint(self, cursor, file_path):
+        """Удаление контрольной точки после завершения импорта файла"""
+        cursor.execute(f"DELETE FROM {CHECKPOINT_TABLE} WHERE file_path = %s",
+                       (os.path.abspath(file_path),))
+    
+    def rejects_path(self, file_path):
+        """Путь к файлу отклоненных строк"""
+        return os.path.splitext(file_path)[0] + REJECTS_SUFFIX
+    
+    def write_rejects(self, rejects_path, rejects):
+        """Дописывает отклоненные строки (с номером строки и причиной) в файл отказов"""
+        if rejects is None or rejects.empty:
+            return
+        rejects.to_csv(rejects_path,
+                       sep=';',
+                       mode='a',
+                       header=not os.path.exists(rejects_path),
+                       index_label='row_num',
+                       encoding='utf-8')
+    
+    def load_dimension_cache(self):
+        """Предзагрузка справочников locations и meters в память"""
+        cursor = self.conn.cursor()
+        
+        cursor.execute("SELECT id, location_name FROM locations")
+        self.location_cache = {name: location_id for location_id, name in cursor.fetchall()}
+        
+        cursor.execute("SELECT id, meter_code, location_id, meter_serial FROM meters")
+        self.meter_cache = {
+            (meter_code, location_id): (meter_id, serial)
+            for meter_id, meter_code, location_id, serial in cursor.fetchall()
+        }
+        
+        # Закрываем транзакцию чтения, чтобы не держать снимок до импорта
+        self.conn.rollback()
+        print(f"📚 Справочники загружены: {len(self.location_cache)} населенных пунктов, "
+              f"{len(self.meter_cache)} приборов учета")
+    
+    def resolve_locations(self, cursor, location_names):
+        """Пакетное создание отсутствующих в кэше населенных пунктов"""
+        new_names = sorted(set(location_names) - self.location_cache.keys())
+        if not new_names:
+            return
+        
+        created = execute_values(
+            cursor,
+            "INSERT INTO locations (location_name) VALUES %s RETURNING id, location_name",
+            [(name,) for name in new_names],
+            fetch=True
+        )
+        self.location_cache.update({name: location_id for location_id, name in created})
+    
+    def resolve_meters(self, cursor, latest_serials):
+        """Пакетное создание новых приборов и обновление изменившихся серийных номеров
+        
+        latest_serials: {(meter_code, location_id): meter_serial}
+        """
+        new_meters = []
+        changed_serials = []
+        for (meter_code, location_id), serial in latest_serials.items():
+            cached = self.meter_cache.get((meter_code, location_id))
+            if cached is None:
+                new_meters.append((meter_code, location_id, serial))
+            elif cached[1] != serial:
+                changed_serials.append((cached[0], serial))
+        
+        if new_meters:
+            created = execute_values(
+                cursor,
+                """INSERT INTO meters (meter_code, location_id, meter_serial) VALUES %s
+                   RETURNING id, meter_code, location_id, meter_serial""",
+                new_meters,
+                fetch=True
+            )
+            self.cache_meters(created)
+        
+        if changed_serials:
+            updated = execute_values(
+                cursor,
+                """UPDATE meters m SET meter_serial = v.meter_serial
+                   FROM (VALUES %s) AS v(id, meter_serial)
+                   WHERE m.id = v.id
+                   RETURNING m.id, m.meter_code, m.location_id, m.meter_serial""",
+                changed_serials,
+                fetch=True
+            )
+            self.cache_meters(updated)
+    
+    def cache_meters(self, rows):
+        """Добавление строк (id, meter_code, location_id, meter_serial) в кэш приборов"""
+        for meter_id, meter_code, location_id, serial in rows:
+            self.meter_cache[(meter_code, location_id)] = (meter_id, serial)
     
     def parse_date(self, date_str):
         """Преобразование даты из формата dd.mm.yyyy в datetime"""
@@ -39,111 +253,507 @@ class MeterDataImporter:
             # Пробуем другой формат, если есть проблемы
             return datetime.strptime(date_str, '%d.%m.%y').date()
     
-    def import_from_csv(self, file_path, delimiter=';'):
-        """Импорт данных из CSV файла"""
+    def read_csv_batches(self, file_path, delimiter, batch_size, start_row=0):
+        """Потоковое чтение CSV пакетами фиксированного размера, начиная со строки start_row"""
+        return pd.read_csv(file_path, 
+                          delimiter=delimiter, 
+                          header=None,
+                          names=['location', 'meter_code', 'serial', 'date', 'value', 'type'],
+                          quotechar='"',
+                          dtype=str,
+                          encoding='utf-8',
+                          skiprows=start_row,
+                          chunksize=batch_size)
+    
+    def parse_dates(self, date_str):
+        """Векторный разбор дат dd.mm.yyyy, при ошибке - dd.mm.yy (как в parse_date)"""
+        date_str = date_str.astype(str).str.strip()
+        reading_date = pd.to_datetime(date_str, format='%d.%m.%Y', errors='coerce')
+        return reading_date.fillna(
+            pd.to_datetime(date_str, format='%d.%m.%y', errors='coerce')
+        )
+    
+    def read_import_batches(self, file_path, delimiter, batch_size, months=None, digests=None,
+                            extra_rows=None, start_row=0):
+        """Пакеты CSV для импорта: пары (пакет, номер следующей строки файла)
+        
+        months: множество месяцев 'YYYY-MM', строки других месяцев отбрасываются (None - все).
+        digests: словарь, в который накапливаются дайджесты строк файла по месяцам.
+        extra_rows: номера строк, загружаемых независимо от месяца.
+        start_row: строка, с которой продолжается чтение; индекс пакета - номер строки в файле.
+        """
+        with self.read_csv_batches(file_path, delimiter, batch_size, start_row) as reader:
+            for batch in reader:
+                batch.index += start_row
+                next_row = batch.index[-1] + 1
+                batch_months = self.parse_dates(batch['date']).dt.strftime('%Y-%m')
+                if digests is not None:
+                    merge_month_digests(digests, month_digests(batch, batch_months))
+                if months is not None:
+                    selected = batch_months.isin(months)
+                    if extra_rows:
+                        selected |= batch.index.isin(extra_rows)
+                    batch = batch[selected]
+                yield batch, next_row
+    
+    def scan_file(self, file_path, delimiter, batch_size):
+        """Проход по файлу без загрузки: дайджесты по месяцам и последние строки приборов
+        
+        Возвращает (digests, meter_rows), где meter_rows - номера последних корректных
+        строк каждого прибора. Серийный номер прибора берется из последней строки файла,
+        поэтому при частичной перезагрузке эти строки загружаются вместе с изменившимися
+        месяцами (их показания перезаписываются теми же значениями).
+        """
+        digests = {}
+        last_rows = {}
+        with self.read_csv_batches(file_path, delimiter, batch_size) as reader:
+            for batch in reader:
+                reading_date = self.parse_dates(batch['date'])
+                merge_month_digests(digests, month_digests(batch, reading_date.dt.strftime('%Y-%m')))
+                
+                valid = reading_date.notna() & pd.to_numeric(batch['value'], errors='coerce').notna()
+                meters = pd.DataFrame({
+                    column: batch.loc[valid, column].astype(str).str.strip()
+                                                    .str.replace('"', '', regex=False)
+                    for column in ['location', 'meter_code']
+                })
+                meters = meters[~meters.duplicated(keep='last')]
+                last_rows.update(zip(zip(meters['location'], meters['meter_code']), meters.index))
+        
+        return digests, set(last_rows.values())
+    
+    def plan_import(self, file_path, delimiter, batch_size, force=False):
+        """Сверка файла с журналом импорта
+        
+        Возвращает (months, digests, meter_rows): months - месяцы для загрузки (None - весь
+        файл), digests - готовые дайджесты файла (None - посчитать при загрузке),
+        meter_rows - строки, загружаемые вместе с months (см. scan_file).
+        Если загружать нечего, возвращает None.
+        """
+        if force:
+            return None, None, None
+        
+        status = self.manifest.check(file_path)
+        if status == FILE_UNCHANGED:
+            print(f"⏭️  Файл {os.path.basename(file_path)} не изменился с прошлого импорта, пропускаем")
+            return None
+        if status != FILE_CHANGED:
+            return None, None, None
+        
+        # Файл изменился: сравниваем дайджесты по месяцам с прошлой загрузкой
+        digests, meter_rows = self.scan_file(file_path, delimiter, batch_size)
+        previous = self.manifest.month_digests(file_path)
+        months = {month for month, digest in digests.items() if previous.get(month) != digest}
+        
+        if not months:
+            self.manifest.record(file_path, digests)
+            print(f"⏭️  Данные файла {os.path.basename(file_path)} не изменились, пропускаем")
+            return None
+        
+        print(f"🔁 Файл {os.path.basename(file_path)} изменился, перезагружаем месяцы: "
+              f"{', '.join(sorted(months))}")
+        return months, digests, meter_rows
+    
+    def import_from_csv(self, file_path, delimiter=';', bulk=False, batch_size=DEFAULT_BATCH_SIZE,
+                        force=False):
+        """Импорт данных из CSV файла пакетами по batch_size строк
+        
+        Файлы, уже загруженные без изменений, пропускаются (force=True - загрузить заново).
+        """
+        plan = self.plan_import(file_path, delimiter, batch_size, force)
+        if plan is None:
+            return 0
+        months, digests, meter_rows = plan
+        
+        if bulk:
+            return self.bulk_import_from_csv(file_path, delimiter, batch_size, plan)
+        
         try:
-            # Читаем CSV файл
-            df = pd.read_csv(file_path, 
-                            delimiter=delimiter, 
-                            header=None,
-                            names=['location', 'meter_code', 'serial', 'date', 'value', 'type'],
-                            quotechar='"',
-                            encoding='utf-8')
+            stats = self.run_import(file_path, delimiter, batch_size, plan, self.import_rows_batch)
             
-            print(f"📊 Загружено {len(df)} строк из файла")
+            print(f"\n📈 Импорт завершен:")
+            print(f"   ✅ Успешно импортировано: {stats['imported']} записей")
+            print(f"   ♻️  Дубликатов в пакетах: {stats['merge']['deduplicated']}")
+            print(f"   ⚠️  Пропущено: {stats['rejected']} записей")
+            if stats['rejected']:
+                print(f"   📄 Отклоненные строки: {self.rejects_path(file_path)}")
             
-            cursor = self.conn.cursor()
+            # Выводим статистику
+            self.show_statistics()
             
-            # Импортируем данные
-            imported_count = 0
-            skipped_count = 0
+            return stats['imported']
             
-            for _, row in df.iterrows():
-                try:
-                    # Очистка данных
-                    location = str(row['location']).strip().replace('"', '')
-                    meter_code = str(row['meter_code']).strip().replace('"', '')
-                    serial = str(row['serial']).strip()
-                    date_str = str(row['date']).strip()
-                    value = int(row['value'])
-                    reading_type = str(row['type']).strip().replace('"', '')
-                    
-                    # Преобразуем дату
-                    reading_date = self.parse_date(date_str)
-                    
-                    # 1. Добавляем или получаем location
-                    cursor.execute(
-                        "SELECT id FROM locations WHERE location_name = %s",
-                        (location,)
-                    )
-                    location_result = cursor.fetchone()
-                    
-                    if location_result:
-                        location_id = location_result[0]
-                    else:
-                        cursor.execute(
-                            "INSERT INTO locations (location_name) VALUES (%s) RETURNING id",
-                            (location,)
-                        )
-                        location_id = cursor.fetchone()[0]
-                    
-                    # 2. Добавляем или получаем прибор учета
-                    cursor.execute(
-                        """SELECT id FROM meters 
-                           WHERE meter_code = %s AND location_id = %s""",
-                        (meter_code, location_id)
-                    )
-                    meter_result = cursor.fetchone()
-                    
-                    if meter_result:
-                        meter_id = meter_result[0]
-                        # Обновляем серийный номер, если изменился
-                        cursor.execute(
-                            "UPDATE meters SET meter_serial = %s WHERE id = %s",
-                            (serial, meter_id)
-                        )
-                    else:
-                        cursor.execute(
-                            """INSERT INTO meters (meter_code, location_id, meter_serial) 
-                               VALUES (%s, %s, %s) RETURNING id""",
-                            (meter_code, location_id, serial)
-                        )
-                        meter_id = cursor.fetchone()[0]
-                    
-                    # 3. Добавляем показание
-                    cursor.execute(
-                        """INSERT INTO readings 
-                           (meter_id, reading_date, value, reading_type, source_file)
-                           VALUES (%s, %s, %s, %s, %s)
-                           ON CONFLICT (meter_id, reading_date) 
-                           DO UPDATE SET 
-                               value = EXCLUDED.value,
-                               reading_type = EXCLUDED.reading_type,
-                               source_file = EXCLUDED.source_file""",
-                        (meter_id, reading_date, value, reading_type, os.path.basename(file_path))
-                    )
-                    
-                    imported_count += 1
-                    
-                except Exception as e:
-                    skipped_count += 1
-                    print(f"⚠️ Пропущена строка: {row.to_dict()} - ошибка: {str(e)[:100]}")
+        except Exception as e:
+            self.handle_import_error(file_path, e)
+            return 0
+    
+    def run_import(self, file_path, delimiter, batch_size, plan, load_batch):
+        """Пакетный импорт файла с фиксацией каждого пакета
+        
+        Вместе с пакетом в той же транзакции записывается контрольная точка, поэтому
+        прерванный импорт при следующем запуске продолжается с первой незафиксированной
+        строки. load_batch(cursor, batch, source_file) загружает пакет и возвращает
+        (импортировано, счетчики слияния, отклоненные строки); счетчики суммируются
+        за этот запуск в stats['merge'].
+        """
+        months, digests, meter_rows = plan
+        source_file = os.path.basename(file_path)
+        rejects_path = self.rejects_path(file_path)
+        cursor = self.conn.cursor()
+        
+        checkpoint = self.load_checkpoint(file_path)
+        if checkpoint is not None:
+            start_row, imported_count, rejected_count = checkpoint
+            print(f"⏯️  Продолжаем импорт {source_file} со строки {start_row}")
+        else:
+            start_row, imported_count, rejected_count = 0, 0, 0
+            if os.path.exists(rejects_path):
+                os.remove(rejects_path)
+        
+        # Начало файла в этом запуске не читается, дайджесты для журнала считаем отдельно
+        if digests is None and start_row > 0:
+            digests, _ = self.scan_file(file_path, delimiter, batch_size)
+        file_digests = {} if digests is None else None
+        
+        merge_counts = Counter()
+        next_row = start_row
+        for batch, next_row in self.read_import_batches(file_path, delimiter, batch_size, months,
+                                                        file_digests, meter_rows, start_row):
+            if not batch.empty:
+                imported, counts, rejects = load_batch(cursor, batch, source_file)
+                imported_count += imported
+                merge_counts.update(counts)
+                rejected_count += len(rejects)
+            else:
+                rejects = None
             
+            self.save_checkpoint(cursor, file_path, next_row, imported_count, rejected_count)
             self.conn.commit()
-            print(f"\n📈 Импорт завершен:")
-            print(f"   ✅ Успешно импортировано: {imported_count} записей")
-            print(f"   ⚠️  Пропущено: {skipped_count} записей")
+            self.write_rejects(rejects_path, rejects)
+            print(f"   ... обработано {next_row} строк")
+        
+        self.clear_checkpoint(cursor, file_path)
+        self.conn.commit()
+        self.manifest.record(file_path, digests if digests is not None else file_digests)
+        
+        return {
+            'rows': next_row,
+            'start_row': start_row,
+            'imported': imported_count,
+            'merge': merge_counts,
+            'rejected': rejected_count
+        }
+    
+    def handle_import_error(self, file_path, error):
+        """Откат незафиксированного пакета после ошибки импорта"""
+        self.conn.rollback()
+        # Откаченные вставки не должны остаться в кэше справочников и секций
+        self.load_dimension_cache()
+        self.partitions.reset()
+        print(f"❌ Ошибка при импорте: {error}")
+        
+        checkpoint = self.load_checkpoint(file_path)
+        if checkpoint is not None:
+            print(f"   💾 Зафиксировано строк: {checkpoint[0]}, "
+                  f"повторный запуск продолжит импорт с этого места")
+    
+    def ensure_reading_partitions(self, cursor, reading_dates):
+        """Создание месячных секций readings для дат пакета, если их еще нет"""
+        if self.readings_partitioned:
+            self.partitions.ensure_partitions(cursor, 'readings', reading_dates)
+    
+    def refresh_rollups(self, cursor):
+        """Обновление сводных таблиц по изменениям пакета из rollup_changes"""
+        self.rollups.apply_changes(cursor)
+    
+    def import_rows_batch(self, cursor, df, source_file):
+        """Построчный разбор пакета и запись показаний
+        
+        Возвращает (импортировано, записано показаний, отклоненные строки с причиной).
+        """
+        parsed_rows = []
+        rejected_rows = []
+        errors = []
+        
+        for row_num, row in df.iterrows():
+            try:
+                # Очистка данных
+                location = str(row['location']).strip().replace('"', '')
+                meter_code = str(row['meter_code']).strip().replace('"', '')
+                serial = str(row['serial']).strip()
+                date_str = str(row['date']).strip()
+                value = int(float(row['value']))
+                reading_type = str(row['type']).strip().replace('"', '')
+                
+                # Преобразуем дату
+                reading_date = self.parse_date(date_str)
+                
+                parsed_rows.append(
+                    (location, meter_code, serial, reading_date, value, reading_type)
+                )
+                
+            except Exception as e:
+                rejected_rows.append(row_num)
+                errors.append(str(e)[:100])
+        
+        # 1. Добавляем недостающие location одним пакетом
+        self.resolve_locations(cursor, {r[0] for r in parsed_rows})
+        
+        # 2. Приборы учета: серийный номер берется из последней строки файла
+        latest_serials = {}
+        for location, meter_code, serial, *_ in parsed_rows:
+            latest_serials[(meter_code, self.location_cache[location])] = serial
+        self.resolve_meters(cursor, latest_serials)
+        
+        # 3. Добавляем показания; при повторе прибора и даты в пакете остается последняя строка
+        readings = {}
+        meter_names = {}
+        for location, meter_code, _, reading_date, value, reading_type in parsed_rows:
+            location_id = self.location_cache[location]
+            meter_id = self.meter_cache[(meter_code, location_id)][0]
+            meter_names[meter_id] = (location, readings_subscriber_id(location_id, meter_code))
+            readings[(meter_id, reading_date)] = (
+                meter_id, reading_date, value, reading_type, source_file
+            )
+        self.ensure_reading_partitions(cursor, {key[1] for key in readings})
+        
+        # Прежние значения показаний пакета - для обновления сводных таблиц
+        cursor.execute(
+            """SELECT r.meter_id, r.reading_date, r.value
+               FROM readings r
+               JOIN unnest(%s::int[], %s::date[]) AS t(meter_id, reading_date)
+                 ON r.meter_id = t.meter_id AND r.reading_date = t.reading_date""",
+            ([key[0] for key in readings], [key[1] for key in readings])
+        )
+        previous = {(meter_id, reading_date): value
+                    for meter_id, reading_date, value in cursor.fetchall()}
+        
+        execute_batch(
+            cursor,
+            """INSERT INTO readings 
+               (meter_id, reading_date, value, reading_type, source_file)
+               VALUES (%s, %s, %s, %s, %s)
+               ON CONFLICT (meter_id, reading_date) 
+               DO UPDATE SET 
+                   value = EXCLUDED.value,
+                   reading_type = EXCLUDED.reading_type,
+                   source_file = EXCLUDED.source_file""",
+            list(readings.values()),
+            page_size=1000
+        )
+        changes = [
+            (*meter_names[meter_id], reading_date, previous.get((meter_id, reading_date)), value)
+            for (meter_id, reading_date), (_, _, value, _, _) in readings.items()
+            if previous.get((meter_id, reading_date)) != value
+        ]
+        self.rollups.create_changes_table(cursor)
+        execute_values(cursor, f"INSERT INTO {CHANGES_TABLE} VALUES %s", changes, page_size=1000)
+        self.refresh_rollups(cursor)
+        
+        counts = {'written': len(readings), 'deduplicated': len(parsed_rows) - len(readings)}
+        return len(parsed_rows), counts, df.loc[rejected_rows].assign(error=errors)
+    
+    def prepare_bulk_frame(self, df):
+        """Векторизованная очистка строк для массовой загрузки; возвращает (строки, отклоненные)"""
+        # Номер строки в файле - индекс пакета (см. read_import_batches)
+        staged = pd.DataFrame({'row_num': df.index}, index=df.index)
+        
+        for column in ['location', 'meter_code', 'type']:
+            staged[column] = df[column].astype(str).str.strip().str.replace('"', '', regex=False)
+        staged = staged.rename(columns={'type': 'reading_type'})
+        staged['meter_serial'] = df['serial'].astype(str).str.strip()
+        
+        reading_date = self.parse_dates(df['date'])
+        staged['reading_date'] = reading_date.dt.strftime('%Y-%m-%d')
+        
+        staged['value'] = pd.to_numeric(df['value'], errors='coerce')
+        # Значение должно поместиться в BIGINT: пропуски, бесконечности и числа вне
+        # диапазона int64 отклоняются до приведения типа (сравнение с NaN ложно)
+        value_in_range = staged['value'].abs() < 2 ** 63
+        
+        valid = reading_date.notna() & value_in_range
+        staged = staged[valid].copy()
+        staged['value'] = staged['value'].astype('int64')
+        
+        rejects = df[~valid].assign(
+            error=pd.Series('некорректное значение', index=df.index)
+                    .where(reading_date.notna(), 'некорректная дата')[~valid]
+        )
+        
+        return staged[STAGING_COLUMNS], rejects
+    
+    def copy_to_staging(self, cursor, staged):
+        """Потоковая загрузка подготовленных строк во временную таблицу через COPY"""
+        cursor.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                row_num BIGINT,
+                location TEXT,
+                meter_code TEXT,
+                meter_serial TEXT,
+                reading_date DATE,
+                value BIGINT,
+                reading_type TEXT
+            )
+        """)
+        cursor.execute(f"TRUNCATE {STAGING_TABLE}")
+        
+        buffer = io.StringIO()
+        staged.to_csv(buffer, sep=';', index=False, header=False)
+        buffer.seek(0)
+        
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv, DELIMITER ';')",
+            buffer
+        )
+    
+    def merge_staging(self, cursor, source_file):
+        """Set-based перенос данных из временной таблицы в locations, meters и readings"""
+        # 1. Новые населенные пункты
+        cursor.execute(f"""
+            INSERT INTO locations (location_name)
+            SELECT DISTINCT s.location
+            FROM {STAGING_TABLE} s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM locations l WHERE l.location_name = s.location
+            )
+            RETURNING id, location_name
+        """)
+        self.location_cache.update({name: location_id for location_id, name in cursor.fetchall()})
+        
+        # 2. Новые приборы учета (серийный номер - из последней строки файла)
+        cursor.execute(f"""
+            INSERT INTO meters (meter_code, location_id, meter_serial)
+            SELECT DISTINCT ON (s.meter_code, l.id) s.meter_code, l.id, s.meter_serial
+            FROM {STAGING_TABLE} s
+            JOIN locations l ON l.location_name = s.location
+            WHERE NOT EXISTS (
+                SELECT 1 FROM meters m
+                WHERE m.meter_code = s.meter_code AND m.location_id = l.id
+            )
+            ORDER BY s.meter_code, l.id, s.row_num DESC
+            RETURNING id, meter_code, location_id, meter_serial
+        """)
+        self.cache_meters(cursor.fetchall())
+        
+        # 3. Серийные номера существующих приборов - только если изменились
+        cursor.execute(f"""
+            UPDATE meters m
+            SET meter_serial = latest.meter_serial
+            FROM (
+                SELECT DISTINCT ON (s.meter_code, l.id)
+                    s.meter_code, l.id AS location_id, s.meter_serial
+                FROM {STAGING_TABLE} s
+                JOIN locations l ON l.location_name = s.location
+                ORDER BY s.meter_code, l.id, s.row_num DESC
+            ) latest
+            WHERE m.meter_code = latest.meter_code
+              AND m.location_id = latest.location_id
+              AND m.meter_serial IS DISTINCT FROM latest.meter_serial
+            RETURNING m.id, m.meter_code, m.location_id, m.meter_serial
+        """)
+        self.cache_meters(cursor.fetchall())
+        
+        # 4. Показания одним оператором (дубликаты пакета уже убраны в load_bulk_batch);
+        # совпадающие строки не перезаписываются. Основной запрос видит readings до вставки,
+        # поэтому строки без пары в readings - новые (xmax недоступен для секционированной
+        # таблицы), а прежние значения измененных строк пишутся в изменения для сводок
+        self.rollups.create_changes_table(cursor)
+        cursor.execute(f"""
+            WITH upserted AS (
+                INSERT INTO readings
+                    (meter_id, reading_date, value, reading_type, source_file)
+                SELECT m.id, s.reading_date, s.value, s.reading_type, %s
+                FROM {STAGING_TABLE} s
+                JOIN locations l ON l.location_name = s.location
+                JOIN meters m ON m.meter_code = s.meter_code AND m.location_id = l.id
+                ON CONFLICT (meter_id, reading_date)
+                DO UPDATE SET
+                    value = EXCLUDED.value,
+                    reading_type = EXCLUDED.reading_type,
+                    source_file = EXCLUDED.source_file
+                WHERE (readings.value, readings.reading_type, readings.source_file)
+                      IS DISTINCT FROM
+                      (EXCLUDED.value, EXCLUDED.reading_type, EXCLUDED.source_file)
+                RETURNING meter_id, reading_date, value
+            ),
+            changes AS (
+                INSERT INTO {CHANGES_TABLE}
+                SELECT l.location_name, {READINGS_SUBSCRIBER_KEY}, u.reading_date, r.value, u.value
+                FROM upserted u
+                JOIN meters m ON m.id = u.meter_id
+                JOIN locations l ON l.id = m.location_id
+                LEFT JOIN readings r ON r.meter_id = u.meter_id AND r.reading_date = u.reading_date
+                WHERE r.value IS DISTINCT FROM u.value
+            )
+            SELECT COUNT(*) FILTER (WHERE r.meter_id IS NULL),
+                   COUNT(*) FILTER (WHERE r.meter_id IS NOT NULL)
+            FROM upserted u
+            LEFT JOIN readings r ON r.meter_id = u.meter_id AND r.reading_date = u.reading_date
+        """, (source_file,))
+        
+        inserted, updated = cursor.fetchone()
+        return inserted, updated
+    
+    def bulk_import_from_csv(self, file_path, delimiter=';', batch_size=DEFAULT_BATCH_SIZE,
+                             plan=(None, None, None)):
+        """Массовый импорт CSV: COPY FROM STDIN во временную таблицу и set-based слияние
+        
+        plan - (months, digests, meter_rows) из plan_import, по умолчанию весь файл.
+        """
+        try:
+            started = time.perf_counter()
+            stats = self.run_import(file_path, delimiter, batch_size, plan, self.load_bulk_batch)
+            
+            elapsed = time.perf_counter() - started
+            rows_read = stats['rows'] - stats['start_row']
+            rows_per_second = rows_read / elapsed if elapsed > 0 else 0
+            
+            print(f"\n📈 Массовый импорт завершен за {elapsed:.1f} с:")
+            print(f"   📊 Прочитано из файла: {stats['rows']} строк")
+            print(f"   ✅ Успешно импортировано: {stats['imported']} записей")
+            merge = stats['merge']
+            print(f"   ➕ Добавлено показаний: {merge['inserted']}")
+            print(f"   🔁 Обновлено показаний: {merge['updated']}")
+            print(f"   ⏸️  Без изменений: {merge['unchanged']}")
+            print(f"   ♻️  Дубликатов в пакетах: {merge['deduplicated']}")
+            print(f"   ⚠️  Пропущено: {stats['rejected']} записей")
+            if stats['rejected']:
+                print(f"   📄 Отклоненные строки: {self.rejects_path(file_path)}")
+            print(f"   🚀 Скорость: {rows_per_second:,.0f} строк/с")
             
-            # Выводим статистику
             self.show_statistics()
             
-            return imported_count
+            return stats['imported']
             
         except Exception as e:
-            self.conn.rollback()
-            print(f"❌ Ошибка при импорте: {e}")
+            self.handle_import_error(file_path, e)
             return 0
     
+    def load_bulk_batch(self, cursor, batch, source_file):
+        """Загрузка пакета через временную таблицу (см. run_import)
+        
+        Повторы прибора и даты внутри пакета отбрасываются до COPY, остается
+        последняя строка в порядке файла; повторы между пакетами разрешает ON CONFLICT.
+        """
+        staged, rejects = self.prepare_bulk_frame(batch)
+        unique = staged.drop_duplicates(['location', 'meter_code', 'reading_date'], keep='last')
+        
+        self.ensure_reading_partitions(
+            cursor, pd.to_datetime(unique['reading_date'].unique()).date
+        )
+        self.copy_to_staging(cursor, unique)
+        inserted, updated = self.merge_staging(cursor, source_file)
+        self.refresh_rollups(cursor)
+        
+        counts = {
+            'inserted': inserted,
+            'updated': updated,
+            'unchanged': len(unique) - inserted - updated,
+            'deduplicated': len(staged) - len(unique)
+        }
+        return len(staged), counts, rejects
+    
     def show_statistics(self):
         """Показать статистику по импортированным данным"""
         cursor = self.conn.cursor()
@@ -174,42 +784,122 @@ class MeterDataImporter:
         for type_name, count in types_stats:
             print(f"     {type_name}: {count}")
     
-    def export_to_csv(self, output_file, location=None):
-        """Экспорт данных в CSV"""
+    def open_export_stream(self, output_file, compression=None):
+        """Бинарный поток для записи экспорта: файл, gzip или zstd
+        
+        compression: None (по расширению output_file), 'gzip' или 'zstd'.
+        Для zstd нужен пакет zstandard.
+        """
+        if compression is None:
+            compression = EXPORT_COMPRESSIONS.get(os.path.splitext(output_file)[1].lower())
+        
+        if compression is None:
+            return open(output_file, 'wb')
+        if compression == 'gzip':
+            return gzip.open(output_file, 'wb', compresslevel=6)
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError("Для сжатия zstd установите пакет zstandard")
+            return zstandard.ZstdCompressor().stream_writer(open(output_file, 'wb'),
+                                                            closefd=True)
+        raise ValueError(f"Неизвестный формат сжатия: {compression}")
+    
+    def copy_export(self, cursor, output_file, location=None, compression=None):
+        """Потоковая выгрузка показаний через COPY (SELECT ...) TO STDOUT
+        
+        Строки идут с сервера прямо в файл блоками по COPY_BUFFER_SIZE, поэтому
+        память клиента не зависит от объема таблицы. Возвращает число строк.
+        """
+        query = EXPORT_QUERY
+        if location:
+            query += cursor.mogrify(" WHERE location_name = %s", (location,)).decode()
+        query += " ORDER BY location_name, meter_code, reading_date"
+        
+        with self.open_export_stream(output_file, compression) as stream:
+            cursor.copy_expert(
+                f"COPY ({query}) TO STDOUT WITH (FORMAT csv, DELIMITER ';')",
+                stream,
+                size=COPY_BUFFER_SIZE
+            )
+        return cursor.rowcount
+    
+    def export_to_csv(self, output_file, location=None, compression=None):
+        """Экспорт данных в CSV (.csv, .csv.gz или .csv.zst)"""
         try:
-            query = """
-            SELECT 
-                location_name,
-                meter_code,
-                meter_serial,
-                TO_CHAR(reading_date, 'DD.MM.YYYY') as reading_date,
-                value,
-                reading_type
-            FROM v_full_readings
-            """
-            
-            params = []
-            if location:
-                query += " WHERE location_name = %s"
-                params.append(location)
-            
-            query += " ORDER BY location_name, meter_code, reading_date"
-            
-            df = pd.read_sql_query(query, self.conn, params=params)
-            
-            # Экспортируем в CSV
-            df.to_csv(output_file, 
-                     sep=';', 
-                     index=False, 
-                     header=False,
-                     quotechar='"',
-                     encoding='utf-8')
+            cursor = self.conn.cursor()
+            exported = self.copy_export(cursor, output_file, location, compression)
+            self.conn.rollback()
             
             print(f"✅ Данные экспортированы в {output_file}")
-            print(f"   Экспортировано {len(df)} записей")
+            print(f"   Экспортировано {exported} записей")
             
         except Exception as e:
+            self.conn.rollback()
             print(f"❌ Ошибка экспорта: {e}")
+    
+    def export_location(self, pool, output_file, location, compression):
+        """Экспорт одного населенного пункта на соединении из пула"""
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                exported = self.copy_export(cursor, output_file, location, compression)
+            conn.rollback()
+            return exported
+        finally:
+            pool.putconn(conn)
+    
+    def export_by_location(self, output_folder, extension='.csv', compression=None,
+                           workers=EXPORT_WORKERS):
+        """Параллельный экспорт: отдельный файл на каждый населенный пункт
+        
+        Выгрузки идут одновременно по workers соединениям из пула; каждая - потоком
+        COPY TO STDOUT, как в export_to_csv. extension определяет сжатие ('.csv.gz').
+        Если имена разных пунктов дают одно имя файла (без учета регистра), к нему
+        добавляется id пункта. Возвращает {населенный пункт: путь к файлу}.
+        """
+        os.makedirs(output_folder, exist_ok=True)
+        
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, location_name FROM locations ORDER BY location_name")
+        locations = cursor.fetchall()
+        self.conn.rollback()
+        
+        stems = {location: re.sub(r'[^\w.-]+', '_', location) for _, location in locations}
+        stem_counts = Counter(stem.lower() for stem in stems.values())
+        output_files = {}
+        for location_id, location in locations:
+            stem = stems[location]
+            if stem_counts[stem.lower()] > 1:
+                stem = f"{stem}_{location_id}"
+            output_files[location] = os.path.join(output_folder, stem + extension)
+        
+        started = time.perf_counter()
+        exported_total = 0
+        pool = ThreadedConnectionPool(1, workers, **DB_CONFIG)
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(self.export_location, pool, output_file, location,
+                                    compression): location
+                    for location, output_file in output_files.items()
+                }
+                for future in as_completed(futures):
+                    location = futures[future]
+                    try:
+                        exported = future.result()
+                        exported_total += exported
+                        print(f"   📍 {location}: {exported} записей")
+                    except Exception as e:
+                        print(f"❌ Ошибка экспорта {location}: {e}")
+        finally:
+            pool.closeall()
+        
+        print(f"✅ Экспорт по населенным пунктам завершен за "
+              f"{time.perf_counter() - started:.1f} с: {exported_total} записей, "
+              f"{len(output_files)} файлов в {output_folder}")
+        return output_files
 
 def main():
     importer = MeterDataImporter()
@@ -217,7 +907,7 @@ def main():
     try:
         # Импортируем данные
         print("🔄 Начинаем импорт данных...")
-        imported = importer.import_from_csv('data.csv')
+        imported = importer.import_from_csv('data.csv', bulk=True)
         
         if imported > 0:
             # Экспортируем для проверки
@@ -1,16 +1,112 @@
 import polars as pl
+import numpy as np
+import io
+import mmap
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
 from pathlib import Path
+from typing import Iterable, Optional
 import logging
 
+from src.data_processing.compact import compact_polars, memory_per_row
+
 logger = logging.getLogger(__name__)
 
+# Столбцы очищенного Parquet-датасета (data/data_preprocessing.py) -> имена загрузчика
+CLEANED_COLUMN_NAMES = {
+    "city": "management",
+    "account_number": "subscriber_id",
+    "meter_number": "md_id",
+    "reading_date": "date",
+    "consumption": "gas_consumption",
+    "reading_method": "source",
+}
+
+# Столбцы и типы исходных CSV (как в load_single_file)
+RAW_COLUMNS = ["management", "subscriber_id", "md_id", "date", "gas_consumption", "source"]
+RAW_SCHEMA_OVERRIDES = {
+    "subscriber_id": pl.Utf8,
+    "md_id": pl.Int64,
+    "gas_consumption": pl.Float32,
+    "date": pl.Utf8,
+}
+
+# Загрузки больше этого размера разбираются частями, выровненными по строкам
+UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Размер диапазона байтов при параллельной загрузке одного файла
+FILE_RANGE_SIZE = 64 * 1024 * 1024
+
+# Окно поиска конца строки после границы части
+LINE_SEARCH_WINDOW = 64 * 1024
+
+
+def line_aligned_ranges(buffer, chunk_size: int, quote_char: str = '"'):
+    """Разбиение CSV в памяти на диапазоны байтов [start, end) примерно по chunk_size
+    
+    Каждый диапазон заканчивается переводом строки вне кавычек, поэтому его можно
+    разбирать отдельно. buffer - любой объект с буферным протоколом (bytes, memoryview,
+    mmap); данные не копируются.
+    """
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    quote = ord(quote_char)
+    newline = ord("\n")
+    size = len(data)
+    
+    start = 0
+    while start < size:
+        end = start + chunk_size
+        if end >= size:
+            yield start, size
+            return
+        
+        # Нечетное число кавычек от начала диапазона - граница внутри поля в кавычках
+        inside = np.count_nonzero(data[start:end] == quote) % 2 == 1
+        position = end
+        end = size
+        while position < size:
+            window = data[position:position + LINE_SEARCH_WINDOW]
+            line_end = None
+            for offset in np.flatnonzero((window == newline) | (window == quote)):
+                if window[offset] == quote:
+                    inside = not inside
+                elif not inside:
+                    line_end = position + offset + 1
+                    break
+            if line_end is not None:
+                end = line_end
+                break
+            position += len(window)
+        
+        yield start, end
+        start = end
+
+def read_csv_range(file_path: str, start: int, end: int) -> pl.DataFrame:
+    """Разбор диапазона байтов [start, end) файла в рабочем процессе"""
+    with open(file_path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return GasDataLoader.read_csv_buffer(io.BytesIO(data))
+
+
 class GasDataLoader:
     def __init__(self, data_dir: str = "data/raw"):
         self.data_dir = Path(data_dir)
         
-    def load_single_file(self, file_path: Path) -> pl.DataFrame:
-        """Загрузка одного CSV файла с помощью Polars"""
+    def load_single_file(self, file_path: Path, workers: int = 1) -> pl.DataFrame:
+        """Загрузка одного CSV файла с помощью Polars
+        
+        При workers > 1 файл разбирается по диапазонам байтов в отдельных процессах
+        (см. load_file_ranges). Результат приводится к компактной схеме (compact_polars).
+        """
         try:
+            if workers > 1:
+                df = compact_polars(self.load_file_ranges(file_path, workers))
+                logger.info(f"Loaded {df.height} rows from {file_path.name} ({workers} workers), "
+                            f"{memory_per_row(df):.1f} bytes/row")
+                return df
+            
             df = pl.read_csv(
                 file_path,
                 separator=';',
@@ -28,40 +124,162 @@ class GasDataLoader:
                     "date": pl.Utf8
                 }
             )
-            logger.info(f"Loaded {df.height} rows from {file_path.name}")
+            df = compact_polars(df)
+            logger.info(f"Loaded {df.height} rows from {file_path.name}, "
+                        f"{memory_per_row(df):.1f} bytes/row")
             return df
         except Exception as e:
             logger.error(f"Error loading {file_path}: {e}")
             return None
     
+    def load_file_ranges(self, file_path: Path, workers: int) -> pl.DataFrame:
+        """Параллельный разбор большого CSV по диапазонам байтов
+        
+        Файл делится на диапазоны около FILE_RANGE_SIZE, выровненные по переводам строк
+        вне кавычек; каждый разбирается в отдельном процессе, результаты склеиваются
+        в исходном порядке строк. Процессы запускаются через spawn, чтобы не наследовать
+        потоки polars родительского процесса (Streamlit).
+        """
+        file_path = Path(file_path)
+        with open(file_path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                ranges = list(line_aligned_ranges(mapped, FILE_RANGE_SIZE))
+        
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            frames = list(executor.map(
+                read_csv_range,
+                [str(file_path)] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges],
+            ))
+        return pl.concat(frames)
+    
+    @staticmethod
+    def read_csv_buffer(source) -> pl.DataFrame:
+        """Разбор CSV из файлового объекта в памяти (формат как в load_single_file)"""
+        return pl.read_csv(
+            source,
+            separator=';',
+            quote_char='"',
+            has_header=False,
+            new_columns=RAW_COLUMNS,
+            schema_overrides=RAW_SCHEMA_OVERRIDES
+        )
+    
     def load_from_upload(self, uploaded_file) -> pl.DataFrame:
-        """Загрузка данных из загруженного файла Streamlit"""
-        import tempfile
-        import io
+        """Загрузка данных из загруженного файла Streamlit
         
+        Байты загрузки передаются в polars без декодирования в str и копии в StringIO.
+        Загрузки больше UPLOAD_CHUNK_SIZE разбираются по частям, выровненным по строкам:
+        в памяти одновременно находятся исходные байты, одна часть и результат.
+        """
+        buffer = None
         try:
-            # Читаем содержимое файла
-            content = uploaded_file.getvalue().decode('utf-8')
+            buffer = uploaded_file.getbuffer()
+            if buffer.nbytes <= UPLOAD_CHUNK_SIZE:
+                uploaded_file.seek(0)
+                df = self.read_csv_buffer(uploaded_file)
+            else:
+                df = pl.concat([
+                    self.read_csv_buffer(io.BytesIO(buffer[start:end]))
+                    for start, end in line_aligned_ranges(buffer, UPLOAD_CHUNK_SIZE)
+                ])
+            df = compact_polars(df)
+            logger.info(f"Loaded {df.height} rows from uploaded file, "
+                        f"{memory_per_row(df):.1f} bytes/row")
+            return df
+        except Exception as e:
+            logger.error(f"Error loading uploaded file: {e}")
+            return None
+        finally:
+            if buffer is not None:
+                buffer.release()
+    
+    def scan_directory(
+        self,
+        source: str = "cleaned",
+        columns: Optional[Iterable[str]] = None,
+        managements: Optional[Iterable[str]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> pl.LazyFrame:
+        """Ленивое сканирование всех файлов каталога данных
+        
+        source: "cleaned" - секционированный Parquet из data_dir/cleaned,
+                "raw" - исходные CSV data_dir/*.csv.
+        Столбцы в обоих случаях называются как в load_single_file и приводятся
+        к компактной схеме (compact_polars). Фильтры и список
+        столбцов передаются в сканер: для Parquet отсекаются секции city=.../year=...
+        и не читаются лишние столбцы. Результат можно передать в
+        GasDataCleaner.clean_data и FeatureEngineer без промежуточного collect().
+        """
+        if source == "cleaned":
+            lf = pl.scan_parquet(
+                self.data_dir / "cleaned" / "**" / "*.parquet", hive_partitioning=True
+            )
             
-            # Используем StringIO для имитации файла
-            df = pl.read_csv(
-                io.StringIO(content),
+            # Фильтры по столбцам секций - отсечение каталогов без чтения файлов
+            if managements is not None:
+                lf = lf.filter(pl.col("city").is_in(list(managements)))
+            if date_from is not None:
+                lf = lf.filter(
+                    (pl.col("year") >= date_from.year) & (pl.col("reading_date") >= date_from)
+                )
+            if date_to is not None:
+                lf = lf.filter(
+                    (pl.col("year") <= date_to.year) & (pl.col("reading_date") <= date_to)
+                )
+            
+            return compact_polars(lf.select([
+                pl.col(source_name).alias(target)
+                for source_name, target in CLEANED_COLUMN_NAMES.items()
+                if columns is None or target in columns
+            ]))
+        
+        if source == "raw":
+            lf = pl.scan_csv(
+                self.data_dir / "*.csv",
                 separator=';',
                 quote_char='"',
+                encoding='utf8',
                 has_header=False,
-                new_columns=[
-                    "management", "subscriber_id", "md_id", 
-                    "date", "gas_consumption", "source"
-                ],
-                dtypes={
-                    "subscriber_id": pl.Utf8,
-                    "md_id": pl.Int64,
-                    "gas_consumption": pl.Float32,
-                    "date": pl.Utf8
-                }
+                new_columns=RAW_COLUMNS,
+                schema_overrides=RAW_SCHEMA_OVERRIDES,
             )
-            logger.info(f"Loaded {df.height} rows from uploaded file")
+            
+            if managements is not None:
+                lf = lf.filter(pl.col("management").is_in(list(managements)))
+            if date_from is not None or date_to is not None:
+                reading_date = pl.col("date").str.strptime(pl.Date, format="%d.%m.%Y", strict=False)
+                if date_from is not None:
+                    lf = lf.filter(reading_date >= date_from)
+                if date_to is not None:
+                    lf = lf.filter(reading_date <= date_to)
+            
+            if columns is not None:
+                lf = lf.select([name for name in RAW_COLUMNS if name in columns])
+            return compact_polars(lf)
+        
+        raise ValueError(f"Unknown source: {source}")
+    
+    def load_cleaned(
+        self,
+        columns: Optional[Iterable[str]] = None,
+        managements: Optional[Iterable[str]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+    ) -> pl.DataFrame:
+        """Загрузка очищенных данных из секционированного Parquet (data_dir/cleaned)
+        
+        Читаются только запрошенные столбцы; фильтры по управлению и периоду
+        передаются в сканер и отсекают лишние секции city=.../year=... целиком.
+        """
+        try:
+            df = self.scan_directory("cleaned", columns, managements, date_from, date_to).collect()
+            logger.info(f"Loaded {df.height} rows from {self.data_dir / 'cleaned'}, "
+                        f"{memory_per_row(df):.1f} bytes/row")
             return df
         except Exception as e:
-            logger.error(f"Error loading uploaded file: {e}")
-            return None
\ No newline at end of file
+            logger.error(f"Error loading {self.data_dir / 'cleaned'}: {e}")
+            return None
@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST_PATH = "data/import_manifest.sqlite"
+
+# Размер блока при вычислении хэша содержимого файла
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Состояния файла относительно журнала
+FILE_NEW = "new"
+FILE_UNCHANGED = "unchanged"
+FILE_CHANGED = "changed"
+
+
+def file_content_hash(file_path: str) -> str:
+    """Хэш содержимого файла (BLAKE2b), файл читается потоком"""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def month_digests(rows: pd.DataFrame, months: pd.Series) -> Dict[str, Tuple[int, int]]:
+    """Дайджесты строк пакета по месяцам: {'YYYY-MM': (сумма хэшей строк mod 2^64, число строк)}
+
+    Сумма хэшей не зависит от порядка строк и складывается по пакетам
+    (см. merge_month_digests), поэтому файл можно обходить частями.
+    """
+    hashes = pd.util.hash_pandas_object(rows, index=False)
+    grouped = hashes.groupby(months.values).agg(["sum", "count"])
+    return {
+        month: (int(hash_sum), int(count))
+        for month, hash_sum, count in zip(grouped.index, grouped["sum"], grouped["count"])
+    }
+
+
+def merge_month_digests(total: Dict[str, Tuple[int, int]],
+                        batch: Dict[str, Tuple[int, int]]) -> None:
+    """Добавляет дайджесты пакета к накопленным (на месте)"""
+    for month, (hash_sum, count) in batch.items():
+        prev_sum, prev_count = total.get(month, (0, 0))
+        total[month] = ((prev_sum + hash_sum) % 2**64, prev_count + count)
+
+
+class ImportManifest:
+    """Журнал обработанных файлов в локальной базе SQLite
+
+    Файл идентифицируется путем, размером, временем изменения и хэшем содержимого.
+    Если размер и mtime совпадают с записью журнала, файл считается неизменным без
+    чтения; иначе сравнивается хэш. Для файлов, загружаемых в БД, дополнительно
+    хранятся дайджесты строк по месяцам, чтобы перезагружать только изменившиеся месяцы.
+    Несколько потребителей (очистка, импорт) ведут записи в одном журнале раздельно.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_MANIFEST_PATH, consumer: str = "import"):
+        self.db_path = db_path
+        self.consumer = consumer
+        # Хэши, уже посчитанные в check(): путь -> (размер, mtime, хэш)
+        self._fingerprints = {}
+
+        folder = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(folder, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self._create_tables()
+
+    def _create_tables(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed_files (
+                    consumer TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    file_size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    processed_at TEXT NOT NULL,
+                    PRIMARY KEY (consumer, file_path)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed_months (
+                    consumer TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    month TEXT NOT NULL,
+                    row_hash TEXT NOT NULL,
+                    row_count INTEGER NOT NULL,
+                    PRIMARY KEY (consumer, file_path, month)
+                )
+            """)
+
+    def close(self):
+        """Закрытие журнала"""
+        self.conn.close()
+
+    @staticmethod
+    def _key(file_path: str) -> str:
+        return os.path.abspath(file_path)
+
+    def _content_hash(self, file_path: str, size: int, mtime_ns: int) -> str:
+        cached = self._fingerprints.get(self._key(file_path))
+        if cached is not None and cached[:2] == (size, mtime_ns):
+            return cached[2]
+        content_hash = file_content_hash(file_path)
+        self._fingerprints[self._key(file_path)] = (size, mtime_ns, content_hash)
+        return content_hash
+
+    def check(self, file_path: str) -> str:
+        """Состояние файла: FILE_NEW, FILE_UNCHANGED или FILE_CHANGED
+
+        Если изменилось только время модификации (файл скопирован заново),
+        запись журнала обновляется и файл считается неизменным.
+        """
+        record = self.conn.execute(
+            """SELECT file_size, mtime_ns, content_hash FROM processed_files
+               WHERE consumer = ? AND file_path = ?""",
+            (self.consumer, self._key(file_path))
+        ).fetchone()
+        if record is None:
+            return FILE_NEW
+
+        stat = os.stat(file_path)
+        if (stat.st_size, stat.st_mtime_ns) == (record[0], record[1]):
+            return FILE_UNCHANGED
+
+        if stat.st_size == record[0]:
+            content_hash = self._content_hash(file_path, stat.st_size, stat.st_mtime_ns)
+            if content_hash == record[2]:
+                with self.conn:
+                    self.conn.execute(
+                        """UPDATE processed_files SET mtime_ns = ?
+                           WHERE consumer = ? AND file_path = ?""",
+                        (stat.st_mtime_ns, self.consumer, self._key(file_path))
+                    )
+                return FILE_UNCHANGED
+
+        return FILE_CHANGED
+
+    def month_digests(self, file_path: str) -> Dict[str, Tuple[int, int]]:
+        """Дайджесты по месяцам, сохраненные при прошлой загрузке файла"""
+        rows = self.conn.execute(
+            """SELECT month, row_hash, row_count FROM processed_months
+               WHERE consumer = ? AND file_path = ?""",
+            (self.consumer, self._key(file_path))
+        ).fetchall()
+        return {month: (int(row_hash, 16), row_count) for month, row_hash, row_count in rows}
+
+    def record(self, file_path: str,
+               digests: Optional[Dict[str, Tuple[int, int]]] = None) -> None:
+        """Отмечает файл как обработанный (вызывать после успешной фиксации результата)
+
+        digests: дайджесты по месяцам (month_digests); None - не менять сохраненные.
+        """
+        stat = os.stat(file_path)
+        content_hash = self._content_hash(file_path, stat.st_size, stat.st_mtime_ns)
+        key = self._key(file_path)
+
+        with self.conn:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO processed_files
+                   (consumer, file_path, file_size, mtime_ns, content_hash, processed_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (self.consumer, key, stat.st_size, stat.st_mtime_ns, content_hash,
+                 datetime.now().isoformat(timespec="seconds"))
+            )
+            if digests is not None:
+                self.conn.execute(
+                    "DELETE FROM processed_months WHERE consumer = ? AND file_path = ?",
+                    (self.consumer, key)
+                )
+                self.conn.executemany(
+                    """INSERT INTO processed_months
+                       (consumer, file_path, month, row_hash, row_count)
+                       VALUES (?, ?, ?, ?, ?)""",
+                    [(self.consumer, key, month, f"{hash_sum:016x}", count)
+                     for month, (hash_sum, count) in digests.items()]
+                )
+        logger.info(f"Файл {key} записан в журнал ({self.consumer})")
@@ -0,0 +1,15 @@
+import os
+from typing import Optional
+
+import psycopg2
+
+
+def connect_from_env(dbname: Optional[str] = None):
+    """Подключение по переменным окружения DB_* (как у дашборда)"""
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        database=dbname or os.getenv("DB_NAME", "gas_consumption"),
+        user=os.getenv("DB_USER", "postgres"),
+        password=os.getenv("DB_PASSWORD", ""),
+        port=os.getenv("DB_PORT", "5432")
+    )
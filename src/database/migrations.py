@@ -0,0 +1,355 @@
+import argparse
+import logging
+from typing import List, Optional
+
+from psycopg2 import sql
+
+from src.database.connection import connect_from_env
+
+logger = logging.getLogger(__name__)
+
+# Журнал примененных версий схемы
+MIGRATIONS_TABLE = "schema_migrations"
+
+# Блокировка на время применения, чтобы два запуска не выполняли одну версию
+MIGRATIONS_LOCK_KEY = 72_431_001
+
+ANALYSIS_RESULTS_DDL = """
+    CREATE TABLE IF NOT EXISTS analysis_results (
+        id SERIAL PRIMARY KEY,
+        analysis_type VARCHAR(50),
+        subscriber_id VARCHAR(50),
+        cluster_id INTEGER,
+        anomaly_score FLOAT,
+        forecast_value FLOAT,
+        confidence_interval JSON,
+        analysis_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        metadata JSON
+    )
+"""
+
+# Версии схемы по порядку. statements выполняются как есть (IF NOT EXISTS: уже
+# созданные вручную таблицы остаются без изменений), indexes - (таблица, метод,
+# столбцы): индекс не создается, если на таблице уже есть индекс того же метода
+# по тем же столбцам (например, ограничение UNIQUE или индекс PartitionManager).
+# Каждая версия применяется в своей транзакции вместе с записью в журнал; версии
+# только из индексов строятся CREATE INDEX CONCURRENTLY вне транзакции (вставки в
+# таблицы не блокируются), а версия записывается после построения всех индексов.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "Базовая схема: справочники, показания, gas_readings, analysis_results",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS locations (
+                id SERIAL PRIMARY KEY,
+                location_name TEXT NOT NULL UNIQUE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS meters (
+                id SERIAL PRIMARY KEY,
+                meter_code TEXT NOT NULL,
+                location_id INTEGER NOT NULL REFERENCES locations(id),
+                meter_serial TEXT,
+                UNIQUE (meter_code, location_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS readings (
+                id BIGSERIAL PRIMARY KEY,
+                meter_id INTEGER NOT NULL REFERENCES meters(id),
+                reading_date DATE NOT NULL,
+                value BIGINT,
+                reading_type TEXT,
+                source_file TEXT,
+                UNIQUE (meter_id, reading_date)
+            )
+            """,
+            """
+            DO $$
+            BEGIN
+                IF to_regclass('v_full_readings') IS NULL THEN
+                    CREATE VIEW v_full_readings AS
+                    SELECT l.location_name, m.meter_code, m.meter_serial,
+                           r.reading_date, r.value, r.reading_type
+                    FROM readings r
+                    JOIN meters m ON m.id = r.meter_id
+                    JOIN locations l ON l.id = m.location_id;
+                END IF;
+            END $$
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS gas_readings (
+                id BIGSERIAL PRIMARY KEY,
+                management VARCHAR(100),
+                subscriber_id VARCHAR(20),
+                meter_id BIGINT,
+                reading_date DATE NOT NULL,
+                consumption NUMERIC(12, 3),
+                data_source VARCHAR(50),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            ANALYSIS_RESULTS_DDL,
+        ],
+    },
+    {
+        "version": 2,
+        "description": "Индексы под запросы дашборда и импорта",
+        "indexes": [
+            # Окно дашборда и агрегаты: диапазон дат, ORDER BY reading_date DESC LIMIT
+            ("gas_readings", "btree", "reading_date"),
+            # История абонента и пересчет сводок по абонентам
+            ("gas_readings", "btree", "subscriber_id, reading_date"),
+            # Фильтр по управлению и список управлений
+            ("gas_readings", "btree", "management, reading_date"),
+            # Дозагрузка новых строк (created_at >= водяной знак): строки добавляются
+            # по возрастанию created_at, BRIN на порядки меньше B-дерева
+            ("gas_readings", "brin", "created_at"),
+            # Пересчет сводок импорта по датам пакета (src/database/rollups.py)
+            ("readings", "btree", "reading_date"),
+            # Поиск справочников при импорте и соединения с показаниями
+            ("locations", "btree", "location_name"),
+            ("meters", "btree", "meter_code, location_id"),
+            ("meters", "btree", "location_id"),
+            ("analysis_results", "btree", "analysis_type, subscriber_id"),
+            ("analysis_results", "brin", "analysis_date"),
+        ],
+    },
+]
+
+
+def index_name(table: str, method: str, columns: str) -> str:
+    """Имя индекса миграции: gas_readings_subscriber_id_reading_date_idx"""
+    suffix = "brin" if method == "brin" else "idx"
+    return f"{table}_{'_'.join(c.strip() for c in columns.split(','))}_{suffix}"
+
+
+def find_index(cursor, table: str, method: str, columns: str) -> Optional[str]:
+    """Имя существующего валидного индекса таблицы с тем же методом и столбцами"""
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes ix "
+        "JOIN pg_index i ON i.indexrelid = "
+        "(quote_ident(ix.schemaname) || '.' || quote_ident(ix.indexname))::regclass "
+        "WHERE ix.schemaname = current_schema() AND ix.tablename = %s AND i.indisvalid",
+        (table,)
+    )
+    definition = f" USING {method} ({columns})"
+    for name, indexdef in cursor.fetchall():
+        if indexdef.endswith(definition):
+            return name
+    return None
+
+
+class MigrationRunner:
+    """Применение версий схемы из MIGRATIONS с записью в schema_migrations"""
+
+    def __init__(self, conn, migrations=MIGRATIONS):
+        self.conn = conn
+        self.migrations = sorted(migrations, key=lambda m: m["version"])
+
+    def ensure_table(self, cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    def applied_versions(self) -> dict:
+        """{версия: время применения}"""
+        with self.conn.cursor() as cursor:
+            self.ensure_table(cursor)
+            cursor.execute(f"SELECT version, applied_at FROM {MIGRATIONS_TABLE}")
+            applied = dict(cursor.fetchall())
+        self.conn.commit()
+        return applied
+
+    def pending(self) -> List[dict]:
+        """Еще не примененные версии по порядку"""
+        applied = self.applied_versions()
+        return [m for m in self.migrations if m["version"] not in applied]
+
+    def ensure_indexes(self, cursor, indexes, concurrently: bool = False) -> List[str]:
+        """Создание недостающих индексов; возвращает имена созданных
+
+        concurrently: CREATE INDEX CONCURRENTLY, соединение должно быть в autocommit.
+        """
+        created = []
+        for table, method, columns in indexes:
+            if find_index(cursor, table, method, columns) is not None:
+                continue
+            name = index_name(table, method, columns)
+            if concurrently:
+                self._create_index_concurrently(cursor, name, table, method, columns)
+            else:
+                cursor.execute(
+                    sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING {} ").format(
+                        sql.Identifier(name), sql.Identifier(table), sql.SQL(method)
+                    ) + sql.SQL(f"({columns})")
+                )
+            created.append(name)
+        for table in sorted({table for table, _, _ in indexes}):
+            cursor.execute(sql.SQL("ANALYZE {}").format(sql.Identifier(table)))
+        return created
+
+    @staticmethod
+    def _drop_invalid_index(cursor, name: str):
+        """Удаление невалидного индекса, оставшегося от прерванного построения
+
+        CREATE INDEX IF NOT EXISTS не пересоздает такой индекс, а планировщик
+        его не использует.
+        """
+        cursor.execute(
+            "SELECT c.relkind FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indexrelid = to_regclass(%s) AND NOT i.indisvalid",
+            (name,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return
+        # Индекс секционированной таблицы удаляется без CONCURRENTLY (только каталог)
+        drop = "DROP INDEX IF EXISTS {}" if row[0] == "I" else "DROP INDEX CONCURRENTLY IF EXISTS {}"
+        cursor.execute(sql.SQL(drop).format(sql.Identifier(name)))
+        logger.info(f"Удален невалидный индекс {name}")
+
+    def _create_index_concurrently(self, cursor, name: str, table: str, method: str, columns: str):
+        """CREATE INDEX CONCURRENTLY; для секционированной таблицы - по секциям
+
+        PostgreSQL не строит CONCURRENTLY индекс секционированной таблицы:
+        на родителе создается индекс ON ONLY, в секциях - CONCURRENTLY, и они
+        подключаются к родительскому (он становится валидным после всех секций).
+        """
+        self._drop_invalid_index(cursor, name)
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        if cursor.fetchone()[0] != "p":
+            cursor.execute(
+                sql.SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS {} ON {} USING {} ").format(
+                    sql.Identifier(name), sql.Identifier(table), sql.SQL(method)
+                ) + sql.SQL(f"({columns})")
+            )
+            return
+
+        cursor.execute(
+            sql.SQL("CREATE INDEX IF NOT EXISTS {} ON ONLY {} USING {} ").format(
+                sql.Identifier(name), sql.Identifier(table), sql.SQL(method)
+            ) + sql.SQL(f"({columns})")
+        )
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname",
+            (table,)
+        )
+        for partition in [row[0] for row in cursor.fetchall()]:
+            partition_index = find_index(cursor, partition, method, columns)
+            if partition_index is None:
+                partition_index = index_name(partition, method, columns)
+                self._create_index_concurrently(
+                    cursor, partition_index, partition, method, columns
+                )
+            cursor.execute(sql.SQL("ALTER INDEX {} ATTACH PARTITION {}").format(
+                sql.Identifier(name), sql.Identifier(partition_index)
+            ))
+
+    def apply(self, migration: dict):
+        """Применение одной версии в отдельной транзакции"""
+        if migration.get("indexes") and not migration.get("statements"):
+            self.apply_concurrently(migration)
+            return
+
+        with self.conn.cursor() as cursor:
+            for statement in migration.get("statements", []):
+                cursor.execute(statement)
+            created = self.ensure_indexes(cursor, migration.get("indexes", []))
+            cursor.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, description) VALUES (%s, %s)",
+                (migration["version"], migration["description"])
+            )
+        self.conn.commit()
+        if created:
+            logger.info(f"Созданы индексы: {', '.join(created)}")
+
+    def apply_concurrently(self, migration: dict):
+        """Версия только из индексов: CREATE INDEX CONCURRENTLY вне транзакции
+
+        Версия записывается после построения всех индексов; если построение
+        прервалось, повторный запуск удаляет невалидный индекс и строит его заново.
+        """
+        self.conn.commit()
+        autocommit = self.conn.autocommit
+        self.conn.autocommit = True
+        try:
+            with self.conn.cursor() as cursor:
+                created = self.ensure_indexes(cursor, migration["indexes"], concurrently=True)
+        finally:
+            self.conn.autocommit = autocommit
+        with self.conn.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {MIGRATIONS_TABLE} (version, description) VALUES (%s, %s)",
+                (migration["version"], migration["description"])
+            )
+        self.conn.commit()
+        if created:
+            logger.info(f"Созданы индексы: {', '.join(created)}")
+
+    def migrate(self, target: Optional[int] = None) -> List[int]:
+        """Применение всех версий до target включительно; возвращает примененные"""
+        applied = []
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+        try:
+            for migration in self.pending():
+                if target is not None and migration["version"] > target:
+                    break
+                try:
+                    self.apply(migration)
+                except Exception:
+                    self.conn.rollback()
+                    raise
+                logger.info(f"Применена версия {migration['version']}: {migration['description']}")
+                applied.append(migration["version"])
+        finally:
+            with self.conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATIONS_LOCK_KEY,))
+            self.conn.commit()
+        return applied
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Версии схемы базы показаний "
+                    "(запуск из корня проекта: python -m src.database.migrations)"
+    )
+    parser.add_argument("--dbname", default=None,
+                        help="База данных (по умолчанию DB_NAME из окружения)")
+    parser.add_argument("--target", type=int, default=None,
+                        help="Применить версии только до указанной включительно")
+    parser.add_argument("--list", action="store_true",
+                        help="Показать версии и их состояние без применения")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    conn = connect_from_env(args.dbname)
+    try:
+        runner = MigrationRunner(conn)
+        if args.list:
+            applied = runner.applied_versions()
+            for migration in runner.migrations:
+                applied_at = applied.get(migration["version"])
+                status = f"✅ {applied_at:%Y-%m-%d %H:%M}" if applied_at else "⏳ не применена"
+                print(f"{migration['version']:>3}  {status}  {migration['description']}")
+            return
+
+        versions = runner.migrate(args.target)
+        if versions:
+            print(f"✅ Применены версии: {', '.join(map(str, versions))}")
+        else:
+            print("ℹ️  Схема актуальна")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import argparse
+import logging
+from datetime import date
+from typing import Iterable, List, Optional
+
+from psycopg2 import sql
+
+from src.database.connection import connect_from_env
+
+logger = logging.getLogger(__name__)
+
+# Таблицы показаний, секционируемые по месяцам.
+# indexes создаются на родительской таблице - PostgreSQL заводит такой же
+# локальный индекс в каждой секции, в том числе в создаваемых позже.
+PARTITIONED_TABLES = {
+    "readings": {
+        "date_column": "reading_date",
+        "indexes": ["(reading_date)"],
+    },
+    "gas_readings": {
+        "date_column": "reading_date",
+        "indexes": ["(reading_date)", "(subscriber_id, reading_date)"],
+    },
+}
+
+# Сколько месяцев вперед держать готовые секции
+DEFAULT_MONTHS_AHEAD = 2
+
+
+def month_start(value: date) -> date:
+    """Первое число месяца"""
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    """Первое число следующего месяца"""
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def month_range(date_from: date, date_to: date) -> List[date]:
+    """Первые числа всех месяцев от date_from до date_to включительно"""
+    months = []
+    current = month_start(date_from)
+    while current <= date_to:
+        months.append(current)
+        current = next_month(current)
+    return months
+
+
+def partition_name(table: str, month: date) -> str:
+    """Имя месячной секции: readings_y2024m01"""
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def default_partition_name(table: str) -> str:
+    """Имя секции по умолчанию (строки месяцев без своей секции): readings_default"""
+    return f"{table}_default"
+
+
+class PartitionManager:
+    """Месячные секции по дате показания (PARTITION BY RANGE)
+
+    Умеет перевести обычную таблицу в секционированную, создать недостающие
+    секции под диапазон дат и поддерживать запас секций на будущие месяцы.
+    Секция по умолчанию принимает строки месяцев, для которых секции еще нет
+    (вставка не падает, если maintain давно не запускался); при создании секции
+    месяца такие строки переносятся в нее. Созданные в текущем сеансе секции
+    кэшируются; после отката транзакции кэш нужно сбросить (reset).
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        # table -> множество месяцев, для которых секция уже есть
+        self._known = {}
+        # table -> есть ли секция по умолчанию
+        self._has_default = {}
+
+    def reset(self):
+        """Сброс кэша известных секций"""
+        self._known = {}
+        self._has_default = {}
+
+    def is_partitioned(self, table: str) -> bool:
+        """Секционирована ли таблица"""
+        with self.conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT 1 FROM pg_partitioned_table p
+                JOIN pg_class c ON c.oid = p.partrelid
+                WHERE c.oid = to_regclass(%s)
+            """, (table,))
+            return cursor.fetchone() is not None
+
+    def existing_months(self, cursor, table: str) -> set:
+        """Месяцы, для которых у таблицы уже есть секции"""
+        if table not in self._known:
+            cursor.execute("""
+                SELECT child.relname FROM pg_inherits i
+                JOIN pg_class child ON child.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+            """, (table,))
+            months = set()
+            prefix = f"{table}_y"
+            for (name,) in cursor.fetchall():
+                if name.startswith(prefix) and name[len(prefix):][4:5] == "m":
+                    suffix = name[len(prefix):]
+                    months.add(date(int(suffix[:4]), int(suffix[5:7]), 1))
+            self._known[table] = months
+        return self._known[table]
+
+    def has_default_partition(self, cursor, table: str) -> bool:
+        """Есть ли у таблицы секция по умолчанию"""
+        if table not in self._has_default:
+            cursor.execute("""
+                SELECT 1 FROM pg_inherits i
+                JOIN pg_class child ON child.oid = i.inhrelid
+                WHERE i.inhparent = to_regclass(%s)
+                  AND pg_get_expr(child.relpartbound, child.oid) = 'DEFAULT'
+            """, (table,))
+            self._has_default[table] = cursor.fetchone() is not None
+        return self._has_default[table]
+
+    def ensure_default_partition(self, cursor, table: str):
+        """Создает секцию по умолчанию, если ее еще нет (в текущей транзакции)"""
+        if not self.has_default_partition(cursor, table):
+            name = default_partition_name(table)
+            cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} DEFAULT").format(
+                sql.Identifier(name), sql.Identifier(table)
+            ))
+            self._has_default[table] = True
+            logger.info(f"Создана секция по умолчанию {name}")
+
+    def ensure_partitions(self, cursor, table: str, months: Iterable[date]) -> List[str]:
+        """Создает недостающие секции для месяцев months (в текущей транзакции)"""
+        existing = self.existing_months(cursor, table)
+        created = []
+        for month in sorted({month_start(m) for m in months} - existing):
+            name = partition_name(table, month)
+            bounds = (month, next_month(month))
+            if self._default_has_rows(cursor, table, *bounds):
+                self._split_default(cursor, table, name, *bounds)
+            else:
+                cursor.execute(
+                    sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF {} "
+                            "FOR VALUES FROM (%s) TO (%s)").format(
+                        sql.Identifier(name), sql.Identifier(table)
+                    ),
+                    bounds
+                )
+            existing.add(month)
+            created.append(name)
+        if created:
+            logger.info(f"Созданы секции {table}: {', '.join(created)}")
+        return created
+
+    def _default_has_rows(self, cursor, table: str, date_from: date, date_to: date) -> bool:
+        """Есть ли в секции по умолчанию строки месяца [date_from, date_to)"""
+        if not self.has_default_partition(cursor, table):
+            return False
+        date_column = sql.Identifier(PARTITIONED_TABLES[table]["date_column"])
+        cursor.execute(
+            sql.SQL("SELECT EXISTS (SELECT 1 FROM {0} WHERE {1} >= %s AND {1} < %s)").format(
+                sql.Identifier(default_partition_name(table)), date_column
+            ),
+            (date_from, date_to)
+        )
+        return cursor.fetchone()[0]
+
+    def _split_default(self, cursor, table: str, name: str, date_from: date, date_to: date):
+        """Секция месяца из строк секции по умолчанию
+
+        CREATE TABLE ... PARTITION OF невозможен, пока строки месяца лежат в секции
+        по умолчанию: они переносятся в отдельную таблицу, которая затем
+        подключается как секция (индексы родителя создаются при подключении).
+        """
+        date_column = sql.Identifier(PARTITIONED_TABLES[table]["date_column"])
+        cursor.execute(
+            sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)").format(
+                sql.Identifier(name), sql.Identifier(table)
+            )
+        )
+        cursor.execute(
+            sql.SQL("""
+                WITH moved AS (
+                    DELETE FROM {0} WHERE {1} >= %s AND {1} < %s RETURNING *
+                )
+                INSERT INTO {2} SELECT * FROM moved
+            """).format(sql.Identifier(default_partition_name(table)), date_column,
+                        sql.Identifier(name)),
+            (date_from, date_to)
+        )
+        logger.info(f"Из {default_partition_name(table)} в {name} перенесено "
+                    f"{cursor.rowcount} строк")
+        cursor.execute(
+            sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+                sql.Identifier(table), sql.Identifier(name)
+            ),
+            (date_from, date_to)
+        )
+
+    def ensure_indexes(self, cursor, table: str):
+        """Индексы родительской таблицы из PARTITIONED_TABLES"""
+        for number, columns in enumerate(PARTITIONED_TABLES[table]["indexes"], start=1):
+            index_name = f"{table}_part_idx{number}"
+            cursor.execute(
+                sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} ").format(
+                    sql.Identifier(index_name), sql.Identifier(table)
+                ) + sql.SQL(columns)
+            )
+
+    def maintain(self, table: str, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> List[str]:
+        """Секции с текущего месяца на months_ahead месяцев вперед, секция по умолчанию и индексы"""
+        today = date.today()
+        last = month_start(today)
+        for _ in range(months_ahead):
+            last = next_month(last)
+        with self.conn.cursor() as cursor:
+            self.ensure_default_partition(cursor, table)
+            created = self.ensure_partitions(cursor, table, month_range(today, last))
+            self.ensure_indexes(cursor, table)
+        self.conn.commit()
+        return created
+
+    def convert_table(self, table: str) -> int:
+        """Перевод обычной таблицы в секционированную по месяцам
+
+        Таблица переименовывается, на ее месте создается секционированная с теми же
+        столбцами, значениями по умолчанию и внешними ключами; первичный ключ и
+        уникальные ограничения переносятся, если содержат столбец даты (иначе
+        PostgreSQL не допускает их в секционированной таблице). Создаются секции всех
+        месяцев данных и секция по умолчанию - для строк будущих месяцев, если maintain
+        не запускался. Данные копируются, зависимые представления пересоздаются,
+        старая таблица удаляется.
+        Все выполняется одной транзакцией. Возвращает число перенесенных строк.
+        """
+        date_column = PARTITIONED_TABLES[table]["date_column"]
+        old_table = f"{table}_unpartitioned"
+
+        try:
+            with self.conn.cursor() as cursor:
+                cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(
+                    sql.Identifier(table), sql.Identifier(old_table)
+                ))
+
+                cursor.execute(
+                    sql.SQL("""
+                        CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING IDENTITY
+                                         INCLUDING GENERATED INCLUDING CONSTRAINTS
+                                         INCLUDING STORAGE INCLUDING COMMENTS)
+                        PARTITION BY RANGE ({})
+                    """).format(sql.Identifier(table), sql.Identifier(old_table),
+                                sql.Identifier(date_column))
+                )
+
+                self._copy_constraints(cursor, old_table, table, date_column)
+                self._transfer_sequences(cursor, old_table, table)
+
+                # Секции под все месяцы, встречающиеся в данных
+                cursor.execute(
+                    sql.SQL("SELECT MIN({0}), MAX({0}) FROM {1}").format(
+                        sql.Identifier(date_column), sql.Identifier(old_table)
+                    )
+                )
+                first, last = cursor.fetchone()
+                if first is not None:
+                    self.ensure_partitions(cursor, table, month_range(first, last))
+                self.ensure_default_partition(cursor, table)
+                self.ensure_indexes(cursor, table)
+
+                cursor.execute(
+                    sql.SQL("INSERT INTO {} OVERRIDING SYSTEM VALUE SELECT * FROM {}").format(
+                        sql.Identifier(table), sql.Identifier(old_table)
+                    )
+                )
+                moved = cursor.rowcount
+
+                self._restore_identity(cursor, table)
+                self._recreate_views(cursor, old_table)
+
+                cursor.execute(sql.SQL("DROP TABLE {}").format(sql.Identifier(old_table)))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self.reset()
+            raise
+
+        logger.info(f"Таблица {table} секционирована по {date_column}, перенесено {moved} строк")
+        return moved
+
+    def _copy_constraints(self, cursor, old_table: str, table: str, date_column: str):
+        """Перенос внешних ключей и совместимых первичных/уникальных ключей"""
+        cursor.execute("""
+            SELECT con.conname, con.contype, pg_get_constraintdef(con.oid),
+                   ARRAY(SELECT a.attname FROM pg_attribute a
+                         WHERE a.attrelid = con.conrelid AND a.attnum = ANY(con.conkey))
+            FROM pg_constraint con
+            WHERE con.conrelid = to_regclass(%s) AND con.contype IN ('p', 'u', 'f')
+        """, (old_table,))
+        for name, kind, definition, columns in cursor.fetchall():
+            if kind in ("p", "u") and date_column not in columns:
+                logger.warning(f"Ограничение {name} ({definition}) не содержит {date_column} "
+                               f"и не переносится в секционированную таблицу {table}")
+                continue
+            # Имя освобождаем у старой таблицы: имена индексов-ограничений уникальны в схеме
+            cursor.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                sql.Identifier(old_table), sql.Identifier(name),
+                sql.Identifier(f"{name}_unpartitioned")
+            ))
+            cursor.execute(
+                sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} ").format(
+                    sql.Identifier(table), sql.Identifier(name)
+                ) + sql.SQL(definition)
+            )
+
+    def _transfer_sequences(self, cursor, old_table: str, table: str):
+        """Последовательности serial-столбцов переходят к новой таблице"""
+        cursor.execute("""
+            SELECT s.oid::regclass::text, a.attname
+            FROM pg_depend d
+            JOIN pg_class s ON s.oid = d.objid AND s.relkind = 'S'
+            JOIN pg_attribute a ON a.attrelid = d.refobjid AND a.attnum = d.refobjsubid
+            WHERE d.refobjid = to_regclass(%s) AND d.deptype = 'a'
+        """, (old_table,))
+        for sequence, column in cursor.fetchall():
+            cursor.execute(
+                sql.SQL("ALTER SEQUENCE {} OWNED BY {}.{}").format(
+                    sql.SQL(sequence), sql.Identifier(table), sql.Identifier(column)
+                )
+            )
+
+    def _restore_identity(self, cursor, table: str):
+        """Счетчики identity-столбцов продолжаются после перенесенных значений"""
+        cursor.execute("""
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = to_regclass(%s) AND attidentity <> '' AND NOT attisdropped
+        """, (table,))
+        for (column,) in cursor.fetchall():
+            cursor.execute(
+                sql.SQL("SELECT setval(pg_get_serial_sequence(%s, %s), "
+                        "COALESCE((SELECT MAX({}) FROM {}), 0) + 1, false)").format(
+                    sql.Identifier(column), sql.Identifier(table)
+                ),
+                (table, column)
+            )
+
+    def _recreate_views(self, cursor, old_table: str):
+        """Пересоздание представлений, ссылавшихся на старую таблицу"""
+        cursor.execute("""
+            SELECT DISTINCT v.oid::regclass::text, pg_get_viewdef(v.oid)
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid
+            JOIN pg_class v ON v.oid = r.ev_class AND v.relkind = 'v'
+            WHERE d.refobjid = to_regclass(%s)
+        """, (old_table,))
+        for view, definition in cursor.fetchall():
+            # Определение хранит ссылку на переименованную таблицу - подставляем новую
+            definition = definition.replace(old_table, old_table[:-len("_unpartitioned")])
+            cursor.execute(sql.SQL("CREATE OR REPLACE VIEW {} AS ").format(sql.SQL(view))
+                           + sql.SQL(definition))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Месячные секции таблиц показаний "
+                    "(запуск из корня проекта: python -m src.database.partitions)"
+    )
+    parser.add_argument("tables", nargs="*", default=["readings"],
+                        choices=sorted(PARTITIONED_TABLES),
+                        help="Таблицы для обслуживания (по умолчанию readings)")
+    parser.add_argument("--dbname", default=None,
+                        help="База данных (по умолчанию DB_NAME из окружения)")
+    parser.add_argument("--convert", action="store_true",
+                        help="Перевести обычные таблицы в секционированные")
+    parser.add_argument("--months-ahead", type=int, default=DEFAULT_MONTHS_AHEAD,
+                        help="Сколько месяцев вперед создавать секции")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    conn = connect_from_env(args.dbname)
+    try:
+        manager = PartitionManager(conn)
+        for table in args.tables:
+            if not manager.is_partitioned(table):
+                if not args.convert:
+                    print(f"⚠️  Таблица {table} не секционирована (используйте --convert)")
+                    continue
+                moved = manager.convert_table(table)
+                print(f"✅ {table}: секционирована, перенесено {moved} строк")
+            created = manager.maintain(table, args.months_ahead)
+            print(f"📅 {table}: новых секций {len(created)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,442 @@
+import argparse
+import logging
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2 import sql
+
+from src.database.connection import connect_from_env
+from src.database.partitions import month_start
+
+logger = logging.getLogger(__name__)
+
+# Абонент базы импорта: код прибора уникален только внутри location,
+# поэтому ключ сводок - id location и код прибора
+READINGS_SUBSCRIBER_KEY = "m.location_id || ':' || m.meter_code"
+
+# Источники показаний для сводных таблиц: столбцы management, subscriber_id,
+# reading_date, consumption. readings - база импорта (MeterDataImporter),
+# gas_readings - таблица дашборда.
+ROLLUP_SOURCES = {
+    "readings": f"""
+        SELECT l.location_name AS management, {READINGS_SUBSCRIBER_KEY} AS subscriber_id,
+               r.reading_date, r.value::float8 AS consumption
+        FROM readings r
+        JOIN meters m ON m.id = r.meter_id
+        JOIN locations l ON l.id = m.location_id
+    """,
+    "gas_readings": """
+        SELECT COALESCE(management, '') AS management, subscriber_id,
+               reading_date, consumption::float8 AS consumption
+        FROM gas_readings
+        WHERE subscriber_id IS NOT NULL AND consumption IS NOT NULL
+    """,
+}
+
+# Источники, в которые пишет не MeterDataImporter: сводки дозагружаются по
+# столбцу времени записи (refresh_new_rows), водяной знак - в rollup_watermarks
+WATERMARK_COLUMNS = {
+    "gas_readings": "created_at",
+}
+
+# Перекрытие при дозагрузке: DEFAULT CURRENT_TIMESTAMP - время начала транзакции,
+# поэтому транзакция, начатая до прошлой дозагрузки и зафиксированная после нее,
+# пишет строки ниже водяного знака
+WATERMARK_OVERLAP = timedelta(minutes=15)
+
+# Блокировка дозагрузки (дашборд и cron могут запустить ее одновременно)
+REFRESH_LOCK_KEY = 72_431_002
+
+# Сводные таблицы; у каждого источника свои (rollup_table_names), чтобы
+# пересчет одного источника не затирал сводки другого. Суммы квадратов позволяют
+# складывать месяцы в общую статистику (среднее, стандартное отклонение) без
+# повторного чтения показаний.
+ROLLUP_TABLES = {
+    "daily": """
+        CREATE TABLE IF NOT EXISTS {daily} (
+            reading_date DATE NOT NULL,
+            management TEXT NOT NULL,
+            consumption_sum DOUBLE PRECISION NOT NULL,
+            readings_count BIGINT NOT NULL,
+            PRIMARY KEY (reading_date, management)
+        )
+    """,
+    "monthly": """
+        CREATE TABLE IF NOT EXISTS {monthly} (
+            subscriber_id TEXT NOT NULL,
+            month_start DATE NOT NULL,
+            consumption_sum DOUBLE PRECISION NOT NULL,
+            consumption_sq_sum DOUBLE PRECISION NOT NULL,
+            readings_count BIGINT NOT NULL,
+            PRIMARY KEY (subscriber_id, month_start)
+        )
+    """,
+    "lifetime": """
+        CREATE TABLE IF NOT EXISTS {lifetime} (
+            subscriber_id TEXT PRIMARY KEY,
+            consumption_sum DOUBLE PRECISION NOT NULL,
+            consumption_sq_sum DOUBLE PRECISION NOT NULL,
+            readings_count BIGINT NOT NULL,
+            mean_consumption DOUBLE PRECISION,
+            std_consumption DOUBLE PRECISION,
+            first_month DATE,
+            last_month DATE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """,
+}
+
+# Суффиксы имен сводных таблиц источника
+ROLLUP_TABLE_SUFFIXES = {
+    "daily": "daily_management_consumption",
+    "monthly": "subscriber_monthly_stats",
+    "lifetime": "subscriber_lifetime_stats",
+}
+
+# Водяные знаки дозагрузки - общие для всех источников (ключ - источник)
+WATERMARKS_DDL = """
+    CREATE TABLE IF NOT EXISTS rollup_watermarks (
+        source TEXT PRIMARY KEY,
+        created_at TIMESTAMP,
+        refreshed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Изменения показаний пакета импорта (см. RollupManager.apply_changes): old_value
+# NULL - показания раньше не было. Временная таблица очищается при фиксации
+CHANGES_TABLE = "rollup_changes"
+CHANGES_DDL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {CHANGES_TABLE} (
+        management TEXT NOT NULL,
+        subscriber_id TEXT NOT NULL,
+        reading_date DATE NOT NULL,
+        old_value DOUBLE PRECISION,
+        new_value DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS
+"""
+
+# Пересчет сводок по месячным строкам (для выбранных абонентов или всех)
+LIFETIME_INSERT = """
+    INSERT INTO {lifetime} (subscriber_id, consumption_sum, consumption_sq_sum,
+        readings_count, mean_consumption, std_consumption, first_month, last_month)
+    SELECT subscriber_id,
+           SUM(consumption_sum), SUM(consumption_sq_sum), SUM(readings_count),
+           SUM(consumption_sum) / SUM(readings_count),
+           CASE WHEN SUM(readings_count) > 1 THEN
+               SQRT(GREATEST(
+                   (SUM(consumption_sq_sum) - SUM(consumption_sum) ^ 2 / SUM(readings_count))
+                   / (SUM(readings_count) - 1), 0))
+           END,
+           MIN(month_start), MAX(month_start)
+    FROM {monthly}
+"""
+
+
+def rollup_table_names(source: str) -> Dict[str, str]:
+    """Имена сводных таблиц источника: daily, monthly, lifetime"""
+    return {kind: f"{source}_{suffix}" for kind, suffix in ROLLUP_TABLE_SUFFIXES.items()}
+
+
+def readings_subscriber_id(location_id: int, meter_code: str) -> str:
+    """Ключ абонента базы импорта в сводках (как READINGS_SUBSCRIBER_KEY)"""
+    return f"{location_id}:{meter_code}"
+
+
+class RollupManager:
+    """Сводные таблицы потребления рядом с таблицей показаний
+
+    <источник>_daily_management_consumption - суммы по дням и управлениям,
+    <источник>_subscriber_monthly_stats - суммы по абонентам и месяцам,
+    <источник>_subscriber_lifetime_stats - итог по абоненту за всю историю.
+    apply_changes прибавляет к сводкам разность новых и прежних значений пакета,
+    refresh пересчитывает затронутые даты и пары (абонент, месяц) по источнику;
+    оба работают в текущей транзакции, поэтому сводки фиксируются вместе с пакетом.
+    """
+
+    def __init__(self, conn, source: str = "readings"):
+        if source not in ROLLUP_SOURCES:
+            raise ValueError(f"Неизвестный источник сводок: {source}")
+        self.conn = conn
+        self.source_name = source
+        self.source = sql.SQL("(" + ROLLUP_SOURCES[source] + ")")
+        self.table_names = rollup_table_names(source)
+        self.tables = {kind: sql.Identifier(name) for kind, name in self.table_names.items()}
+
+    def _sql(self, query: str, **extra):
+        """Запрос с подставленными именами сводных таблиц источника"""
+        return sql.SQL(query).format(**self.tables, **extra)
+
+    def _create_tables(self, cursor):
+        for ddl in ROLLUP_TABLES.values():
+            cursor.execute(self._sql(ddl))
+        cursor.execute(WATERMARKS_DDL)
+
+    def _truncate(self, cursor):
+        cursor.execute(self._sql("TRUNCATE {daily}, {monthly}, {lifetime}"))
+
+    def create_tables(self) -> bool:
+        """Создание сводных таблиц; новые сразу заполняются по всей истории
+
+        Возвращает True, если таблицы были созданы.
+        """
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NULL", (self.table_names["lifetime"],))
+            missing = cursor.fetchone()[0]
+            self._create_tables(cursor)
+            if missing:
+                self._fill_all(cursor)
+        self.conn.commit()
+        return missing
+
+    def rebuild(self):
+        """Полный пересчет сводок по источнику"""
+        with self.conn.cursor() as cursor:
+            self._create_tables(cursor)
+            self._truncate(cursor)
+            self._fill_all(cursor)
+        self.conn.commit()
+
+    def _fill_all(self, cursor):
+        # Водяной знак читается до пересчета: строки, зафиксированные во время него,
+        # попадут и в пересчет, и в следующую дозагрузку (пересчет идемпотентен)
+        watermark = self._latest_created_at(cursor)
+        cursor.execute(self._sql("""
+            INSERT INTO {daily}
+            SELECT reading_date, management, SUM(consumption), COUNT(*)
+            FROM {source} s
+            GROUP BY reading_date, management
+        """, source=self.source))
+        cursor.execute(self._sql("""
+            INSERT INTO {monthly}
+            SELECT subscriber_id, date_trunc('month', reading_date)::date,
+                   SUM(consumption), SUM(consumption * consumption), COUNT(*)
+            FROM {source} s
+            GROUP BY 1, 2
+        """, source=self.source))
+        cursor.execute(self._sql(LIFETIME_INSERT + " GROUP BY subscriber_id"))
+        if self.source_name in WATERMARK_COLUMNS:
+            self._save_watermark(cursor, watermark)
+        logger.info(f"Сводные таблицы {self.source_name} пересчитаны по всей истории")
+
+    def _latest_created_at(self, cursor, since=None):
+        if self.source_name not in WATERMARK_COLUMNS:
+            return None
+        column = sql.Identifier(WATERMARK_COLUMNS[self.source_name])
+        query = sql.SQL("SELECT MAX({}) FROM {}").format(column, sql.Identifier(self.source_name))
+        if since is None:
+            cursor.execute(query)
+        else:
+            cursor.execute(query + sql.SQL(" WHERE {} >= %s").format(column), (since,))
+        return cursor.fetchone()[0]
+
+    def _save_watermark(self, cursor, watermark):
+        cursor.execute("""
+            INSERT INTO rollup_watermarks (source, created_at) VALUES (%s, %s)
+            ON CONFLICT (source) DO UPDATE SET
+                created_at = EXCLUDED.created_at,
+                refreshed_at = CURRENT_TIMESTAMP
+        """, (self.source_name, watermark))
+
+    def refresh_new_rows(self) -> int:
+        """Дозагрузка сводок по строкам, записанным после водяного знака
+
+        Для источников из WATERMARK_COLUMNS (их пишет не MeterDataImporter).
+        Пересчитываются даты и абоненты строк с created_at не раньше водяного знака
+        минус WATERMARK_OVERLAP; без водяного знака сводки пересчитываются целиком.
+        Возвращает число пересчитанных пар (абонент, месяц), -1 - полный пересчет.
+        """
+        if self.source_name not in WATERMARK_COLUMNS:
+            raise ValueError(f"Источник {self.source_name} не поддерживает дозагрузку")
+        column = sql.Identifier(WATERMARK_COLUMNS[self.source_name])
+        table = sql.Identifier(self.source_name)
+
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (REFRESH_LOCK_KEY,))
+            self._create_tables(cursor)
+            cursor.execute("SELECT created_at FROM rollup_watermarks WHERE source = %s",
+                           (self.source_name,))
+            row = cursor.fetchone()
+            if row is None or row[0] is None:
+                self._truncate(cursor)
+                self._fill_all(cursor)
+                self.conn.commit()
+                return -1
+
+            watermark = row[0]
+            # Быстрая проверка по BRIN (created_at): есть ли строки новее знака
+            cursor.execute(
+                sql.SQL("SELECT 1 FROM {} WHERE {} > %s LIMIT 1").format(table, column),
+                (watermark,)
+            )
+            if cursor.fetchone() is None:
+                self.conn.commit()
+                return 0
+
+            since = watermark - WATERMARK_OVERLAP
+            latest = self._latest_created_at(cursor, since)
+            cursor.execute(
+                sql.SQL("""
+                    SELECT DISTINCT subscriber_id, reading_date FROM {}
+                    WHERE {} >= %s AND subscriber_id IS NOT NULL
+                """).format(table, column),
+                (since,)
+            )
+            refreshed = self.refresh(cursor, cursor.fetchall())
+            self._save_watermark(cursor, latest)
+        self.conn.commit()
+        logger.info(f"Сводки дозагружены: пар (абонент, месяц) - {refreshed}")
+        return refreshed
+
+    def create_changes_table(self, cursor):
+        """Временная таблица изменений пакета (CHANGES_TABLE)"""
+        cursor.execute(CHANGES_DDL)
+
+    def apply_changes(self, cursor) -> int:
+        """Применение изменений из CHANGES_TABLE к сводкам (в транзакции cursor)
+
+        Стоимость пропорциональна размеру пакета, а не числу показаний за
+        затронутые даты: дневные и помесячные суммы увеличиваются на разность
+        значений, итог абонента пересчитывается по его месячным строкам.
+        Возвращает число примененных изменений.
+        """
+        cursor.execute(f"SELECT COUNT(*) FROM {CHANGES_TABLE}")
+        changes = cursor.fetchone()[0]
+        if not changes:
+            return 0
+
+        changes_table = sql.Identifier(CHANGES_TABLE)
+        cursor.execute(self._sql("""
+            INSERT INTO {daily} AS d
+            SELECT reading_date, management,
+                   SUM(COALESCE(new_value, 0) - COALESCE(old_value, 0)),
+                   SUM((new_value IS NOT NULL)::int - (old_value IS NOT NULL)::int)
+            FROM {changes}
+            GROUP BY reading_date, management
+            ON CONFLICT (reading_date, management) DO UPDATE SET
+                consumption_sum = d.consumption_sum + EXCLUDED.consumption_sum,
+                readings_count = d.readings_count + EXCLUDED.readings_count
+        """, changes=changes_table))
+        cursor.execute(self._sql("""
+            INSERT INTO {monthly} AS ms
+            SELECT subscriber_id, date_trunc('month', reading_date)::date,
+                   SUM(COALESCE(new_value, 0) - COALESCE(old_value, 0)),
+                   SUM(COALESCE(new_value * new_value, 0) - COALESCE(old_value * old_value, 0)),
+                   SUM((new_value IS NOT NULL)::int - (old_value IS NOT NULL)::int)
+            FROM {changes}
+            GROUP BY 1, 2
+            ON CONFLICT (subscriber_id, month_start) DO UPDATE SET
+                consumption_sum = ms.consumption_sum + EXCLUDED.consumption_sum,
+                consumption_sq_sum = ms.consumption_sq_sum + EXCLUDED.consumption_sq_sum,
+                readings_count = ms.readings_count + EXCLUDED.readings_count
+        """, changes=changes_table))
+
+        # Итоги абонентов - по месячным строкам только затронутых абонентов
+        cursor.execute(self._sql("""
+            DELETE FROM {lifetime}
+            WHERE subscriber_id IN (SELECT subscriber_id FROM {changes})
+        """, changes=changes_table))
+        cursor.execute(self._sql(
+            LIFETIME_INSERT
+            + " WHERE subscriber_id IN (SELECT subscriber_id FROM {changes})"
+            " GROUP BY subscriber_id",
+            changes=changes_table
+        ))
+        cursor.execute(f"TRUNCATE {CHANGES_TABLE}")
+        return changes
+
+    def refresh(self, cursor, touched: Iterable[Tuple[str, date]]) -> int:
+        """Пересчет сводок для затронутых показаний (в транзакции cursor)
+
+        touched: пары (абонент, дата показания) из загруженного пакета.
+        Возвращает число затронутых пар (абонент, месяц).
+        """
+        dates = set()
+        subscriber_months = set()
+        for subscriber_id, reading_date in touched:
+            dates.add(reading_date)
+            subscriber_months.add((subscriber_id, month_start(reading_date)))
+        if not dates:
+            return 0
+
+        dates = sorted(dates)
+        cursor.execute(
+            self._sql("DELETE FROM {daily} WHERE reading_date = ANY(%s::date[])"),
+            (dates,)
+        )
+        cursor.execute(self._sql("""
+            INSERT INTO {daily}
+            SELECT reading_date, management, SUM(consumption), COUNT(*)
+            FROM {source} s
+            WHERE reading_date = ANY(%s::date[])
+            GROUP BY reading_date, management
+        """, source=self.source), (dates,))
+
+        subscribers = [subscriber_id for subscriber_id, _ in subscriber_months]
+        months = [month for _, month in subscriber_months]
+        cursor.execute(self._sql("""
+            DELETE FROM {monthly} ms
+            USING unnest(%s::text[], %s::date[]) AS t(subscriber_id, month_start)
+            WHERE ms.subscriber_id = t.subscriber_id AND ms.month_start = t.month_start
+        """), (subscribers, months))
+        cursor.execute(self._sql("""
+            INSERT INTO {monthly}
+            SELECT s.subscriber_id, t.month_start,
+                   SUM(s.consumption), SUM(s.consumption * s.consumption), COUNT(*)
+            FROM unnest(%s::text[], %s::date[]) AS t(subscriber_id, month_start)
+            JOIN {source} s ON s.subscriber_id = t.subscriber_id
+                           AND s.reading_date >= t.month_start
+                           AND s.reading_date < t.month_start + INTERVAL '1 month'
+            GROUP BY s.subscriber_id, t.month_start
+        """, source=self.source), (subscribers, months))
+
+        unique_subscribers = sorted(set(subscribers))
+        cursor.execute(
+            self._sql("DELETE FROM {lifetime} WHERE subscriber_id = ANY(%s::text[])"),
+            (unique_subscribers,)
+        )
+        cursor.execute(
+            self._sql(LIFETIME_INSERT + " WHERE subscriber_id = ANY(%s::text[]) GROUP BY subscriber_id"),
+            (unique_subscribers,)
+        )
+        return len(subscriber_months)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        description="Сводные таблицы потребления "
+                    "(запуск из корня проекта: python -m src.database.rollups)"
+    )
+    parser.add_argument("--source", default="gas_readings", choices=sorted(ROLLUP_SOURCES),
+                        help="Таблица показаний (по умолчанию gas_readings)")
+    parser.add_argument("--dbname", default=None,
+                        help="База данных (по умолчанию DB_NAME из окружения)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Пересчитать сводки по всей истории")
+    parser.add_argument("--refresh", action="store_true",
+                        help="Дозагрузить строки новее водяного знака (для cron)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    conn = connect_from_env(args.dbname)
+    try:
+        manager = RollupManager(conn, args.source)
+        if args.rebuild:
+            manager.rebuild()
+            print(f"✅ Сводки пересчитаны по {args.source}")
+        elif manager.create_tables():
+            print(f"✅ Сводные таблицы созданы и заполнены по {args.source}")
+        elif args.refresh:
+            refreshed = manager.refresh_new_rows()
+            if refreshed < 0:
+                print(f"✅ Сводки пересчитаны по {args.source}")
+            else:
+                print(f"✅ Сводки дозагружены, пар (абонент, месяц): {refreshed}")
+        else:
+            print("ℹ️  Сводные таблицы уже существуют "
+                  "(--refresh для дозагрузки, --rebuild для полного пересчета)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
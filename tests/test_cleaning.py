@@ -0,0 +1,219 @@
+"""Векторная очистка clean_chunk против прежней посимвольной.
+
+Прежние функции очистки (до перехода на выражения polars) встроены ниже без
+изменений: clean_chunk должен давать тот же результат на любых входных данных,
+в том числе на некорректных.
+
+Запуск из корня проекта: python -m pytest tests
+"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data.data_preprocessing import CLEANED_COLUMNS, clean_chunk
+
+
+def legacy_clean_chunk(df):
+    """Очищает один пакет строк с уже назначенными именами столбцов."""
+    # 1. Сначала обработаем даты - это важно для фильтрации
+    if 'reading_date' in df.columns:
+        # Векторизованная обработка дат
+        def convert_date_vectorized(series):
+            result = []
+            for date_str in series:
+                try:
+                    date_str = str(date_str).strip()
+                    if pd.isna(date_str) or date_str.lower() in ['nan', 'none', '']:
+                        result.append(None)
+                        continue
+
+                    if '.' in date_str:
+                        parts = date_str.split('.')
+                        if len(parts) == 3:
+                            day, month, year = parts
+                            # Очищаем от нецифровых символов
+                            day = ''.join(c for c in day if c.isdigit())
+                            month = ''.join(c for c in month if c.isdigit())
+                            year = ''.join(c for c in year if c.isdigit())
+
+                            if not (day and month and year):
+                                result.append(None)
+                                continue
+
+                            # Форматируем год
+                            if len(year) == 2:
+                                year = '20' + year if int(year) < 50 else '19' + year
+                            elif len(year) == 4:
+                                pass
+                            else:
+                                result.append(None)
+                                continue
+
+                            result.append(f"{year.zfill(4)}-{month.zfill(2)}-{day.zfill(2)}")
+                            continue
+                    result.append(date_str)
+                except:
+                    result.append(None)
+            return result
+
+        df['reading_date'] = convert_date_vectorized(df['reading_date'])
+
+    # 2. Обработка meter_number - убираем все пробелы
+    if 'meter_number' in df.columns:
+        df['meter_number'] = df['meter_number'].astype(str).apply(
+            lambda x: ''.join(c for c in str(x) if c.isdigit())
+        )
+
+    # 3. Обработка consumption - убираем пробелы, заменяем запятую на точку
+    if 'consumption' in df.columns:
+        def clean_consumption_simple(value):
+            try:
+                value_str = str(value).strip()
+                if not value_str or value_str.lower() in ['nan', 'none']:
+                    return None
+
+                # Убираем все пробелы и неразрывные пробелы
+                value_str = value_str.replace(' ', '').replace('\xa0', '')
+                # Заменяем запятую на точку
+                value_str = value_str.replace(',', '.')
+
+                # Извлекаем только цифры, точку и минус
+                cleaned = ''.join(c for c in value_str if c.isdigit() or c in '.-')
+
+                if not cleaned or cleaned == '-':
+                    return None
+
+                # Конвертируем в float
+                return float(cleaned)
+            except:
+                return None
+
+        df['consumption'] = df['consumption'].apply(clean_consumption_simple)
+
+    # 4. Обработка текстовых полей - делаем это в последнюю очередь
+    text_columns = ['city', 'account_number', 'reading_method']
+    for col in text_columns:
+        if col in df.columns:
+            # Быстрая очистка без сложных regex
+            df[col] = df[col].astype(str).apply(
+                lambda x: str(x).strip().replace('"', '').replace('\xa0', ' ')
+            )
+
+    # 5. Удаляем пустые строки
+    mask = df['account_number'].apply(lambda x: str(x).strip() != '') & \
+           df['reading_date'].notna() & \
+           df['meter_number'].apply(lambda x: str(x).strip() != '')
+
+    return df[mask].copy()
+
+
+def make_chunk(**columns):
+    """Пакет как из read_csv(dtype=str): пропуски - NaN, недостающие столбцы заполнены"""
+    size = max(len(values) for values in columns.values())
+    defaults = {
+        'city': 'г.Донецк',
+        'account_number': '1001',
+        'meter_number': '555',
+        'reading_date': '01.02.2023',
+        'consumption': '12,5',
+        'reading_method': 'АСКУЭ',
+    }
+    data = {}
+    for name in CLEANED_COLUMNS:
+        values = columns.get(name, [defaults[name]] * size)
+        data[name] = [np.nan if value is None else value for value in values]
+    return pd.DataFrame(data, dtype=object)
+
+
+def normalize(value):
+    """None и NaN считаются одинаковым пропуском"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return value
+
+
+def assert_same_cleaning(df):
+    expected = legacy_clean_chunk(df.copy()).reset_index(drop=True)
+    actual = clean_chunk(df).to_pandas()
+
+    assert list(actual.columns) == CLEANED_COLUMNS
+    assert len(actual) == len(expected)
+    for column in CLEANED_COLUMNS:
+        assert [normalize(v) for v in actual[column]] == \
+               [normalize(v) for v in expected[column]], column
+
+
+@pytest.mark.parametrize('reading_date', [
+    # Двузначный год: < 50 - XXI век, иначе XX
+    '01.02.23', '1.2.49', '1.2.50', '31.12.99', '01.02.00',
+    # Полный год, пробелы и неразрывные пробелы по краям
+    '01.02.2023', ' 05.06.2021 ', '\xa005.06.21\xa0',
+    # Некорректные даты
+    '1.2.3', '01.02.123', 'ab.cd.ef', '12.xx.2020', '..', '01..2020', '.02.2020',
+    # Не три части через точку - значение остается как есть
+    '2023-01-02', '01.02', '1.2.3.4', 'вчера',
+    # Цифры других алфавитов: арабско-индийские и надстрочные (int() их не примет)
+    '١٢.٠٣.٢٣', '١٢.٠٣.٢٠٢٣', '01.02.²³',
+    # Пропуски
+    'nan', 'NaN', 'None', '', '   ', None,
+])
+def test_dates(reading_date):
+    assert_same_cleaning(make_chunk(reading_date=[reading_date, '01.02.2023']))
+
+
+@pytest.mark.parametrize('consumption', [
+    '12,5', '1 234,5', '1\xa0234,5', ' 7 ', '-3', '-3,25', '.5', '5.', '5,',
+    '-', '--1', '1-', '1.2.3', '1,2,3', 'abc', '12 м3', '²', '١٢,٥', '٣',
+    'nan', 'None', '', '  ', None,
+])
+def test_consumption(consumption):
+    assert_same_cleaning(make_chunk(consumption=[consumption, '1']))
+
+
+@pytest.mark.parametrize('meter_number', [
+    '12 345', '12\xa0345', '№ 0012', 'abc', '', '١٢٣', '²3', 'nan', None,
+])
+def test_meter_numbers(meter_number):
+    assert_same_cleaning(make_chunk(meter_number=[meter_number, '777']))
+
+
+@pytest.mark.parametrize('text', [
+    ' "г.Донецк" ', 'a\xa0b', '\xa0край\xa0', '""', '', '   ', 'Nan', 'None', None,
+])
+def test_text_columns(text):
+    chunk = make_chunk(city=[text, 'x'], account_number=[text, '1'], reading_method=[text, 'y'])
+    assert_same_cleaning(chunk)
+
+
+def test_all_rows_dropped():
+    assert_same_cleaning(make_chunk(account_number=['', ' ', None], meter_number=['a', 'b', 'c']))
+
+
+def test_random_edge_case_mix():
+    """Случайные сочетания проблемных символов во всех столбцах"""
+    rng = random.Random(20261017)
+    alphabet = ['0', '1', '5', '9', '.', ',', '-', ' ', '\xa0', '"', 'a', 'Ж',
+                '٣', '²', '\t', 'nan']
+
+    def value():
+        if rng.random() < 0.05:
+            return None
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 8)))
+
+    def date_value():
+        if rng.random() < 0.5:
+            return value()
+        return '.'.join(value() or '' for _ in range(3))
+
+    size = 2000
+    chunk = make_chunk(
+        city=[value() for _ in range(size)],
+        account_number=[value() for _ in range(size)],
+        meter_number=[value() for _ in range(size)],
+        reading_date=[date_value() for _ in range(size)],
+        consumption=[value() for _ in range(size)],
+        reading_method=[value() for _ in range(size)],
+    )
+    assert_same_cleaning(chunk)